@@ -0,0 +1,55 @@
+"""
+Time approximate (~) searches on a large synthetic glossary.
+
+The first search builds the word index within the search budget and
+leaves the rest of the build to a background thread; this reports how
+long that first search takes, how long the build takes to finish, and
+how long searches take once it has.
+
+    python bench/bench_approx.py --entries 30000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+MY_FOLDER = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.normpath(os.path.join(MY_FOLDER, '..')))
+sys.path.insert(0, MY_FOLDER)
+
+from bench_memory import make_glossary
+from langkit.glossary import Glossary
+
+QUERIES = ['~d:recieve', '~l:kamito', '~d:tiem', '~d:wather']
+
+
+def timed(g, query):
+    start = time.perf_counter()
+    hits = g.find(query)
+    return time.perf_counter() - start, len(hits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=30000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        fname = os.path.join(tmp, 'glossary.md')
+        make_glossary(fname, args.entries)
+        g = Glossary.load(fname)
+        g.find('d:x')
+        elapsed, count = timed(g, QUERIES[0])
+        print(f"first search: {elapsed:.3f}s, {count} hits")
+        start = time.perf_counter()
+        builder = g.index._near_builder
+        if builder:
+            builder.join()
+        print(f"rest of the build: {time.perf_counter() - start:.3f}s")
+        for query in QUERIES:
+            elapsed, count = timed(g, query)
+            print(f"{query}: {elapsed:.3f}s, {count} hits")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare the tokenizer/tagger backends in langkit.tagging on speed and on
+how often the builtin backend's tags agree with nltk's.
+
+Text comes from bench_tagging.make_text(), or from files given on the
+command line. Agreement is counted per token, over sentences that both
+backends split into the same words; nltk is taken as the reference.
+
+    python bench/bench_backends.py --mb 1
+    python bench/bench_backends.py some.txt other.txt
+"""
+import argparse
+import os
+import sys
+import time
+
+MY_FOLDER = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.normpath(os.path.join(MY_FOLDER, '..')))
+sys.path.insert(0, MY_FOLDER)
+
+from bench_tagging import make_text
+from langkit.tagging import BACKENDS, get_backend
+
+
+def run(backend, paragraphs):
+    tagged = []
+    for paragraph in paragraphs:
+        sentences = [backend.word_tokenize(s) for s in backend.sent_tokenize(paragraph)]
+        tagged += backend.tag_sents(sentences)
+    return tagged
+
+
+def agreement(reference, tagged):
+    same = total = 0
+    ref_by_words = {tuple(w for w, _ in sentence): sentence for sentence in reference}
+    for sentence in tagged:
+        ref = ref_by_words.get(tuple(w for w, _ in sentence))
+        if ref is None:
+            continue
+        total += len(sentence)
+        same += sum(1 for (_, a), (_, b) in zip(ref, sentence) if a == b)
+    return same, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('files', nargs='*', help="text files to tag instead of generated text")
+    parser.add_argument('--mb', type=float, default=1.0, help="megabytes of text to generate")
+    parser.add_argument('--backends', default=','.join(BACKENDS), help="comma-separated backend names")
+    args = parser.parse_args()
+    if args.files:
+        paragraphs = []
+        for fname in args.files:
+            with open(fname, 'rt') as f:
+                paragraphs += [p for p in f.read().split('\n\n') if p.strip()]
+    else:
+        paragraphs = make_text(int(args.mb * 1024 * 1024))
+    results = {}
+    for name in args.backends.split(','):
+        backend = get_backend(name)
+        try:
+            # Warm up, so loading models isn't counted as tagging.
+            run(backend, paragraphs[:1])
+        except (ImportError, LookupError) as e:
+            print(f"{name}: unavailable ({e.__class__.__name__})")
+            continue
+        start = time.perf_counter()
+        tagged = run(backend, paragraphs)
+        elapsed = time.perf_counter() - start
+        tokens = sum(len(sentence) for sentence in tagged)
+        results[name] = tagged
+        print(f"{name}: {tokens} tokens in {elapsed:.2f}s, {tokens / elapsed:,.0f} tokens/s")
+    if 'nltk' in results:
+        for name, tagged in results.items():
+            if name != 'nltk':
+                same, total = agreement(results['nltk'], tagged)
+                if total:
+                    print(f"{name} agrees with nltk on {same / total:.1%} of {total} tokens")
+
+
+if __name__ == '__main__':
+    main()
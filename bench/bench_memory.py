@@ -0,0 +1,92 @@
+"""
+Measure how much resident memory a loaded glossary costs.
+
+Generates a synthetic glossary, then loads it in a fresh interpreter and
+reports the growth in RSS. To compare two versions of langkit, check the
+other one out somewhere (for example with `git worktree add`) and run:
+
+    python bench/bench_memory.py --compare /path/to/other/checkout
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+MY_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.normpath(os.path.join(MY_FOLDER, '..'))
+
+CHILD = r'''
+import sys
+sys.path.insert(0, sys.argv[1])
+
+def rss_kb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * (__import__('os').sysconf('SC_PAGE_SIZE') // 1024)
+
+from langkit.glossary import Glossary
+before = rss_kb()
+g = Glossary.load(sys.argv[2])
+for e in g.entries:
+    for item in e.defn.equivs:
+        item.gloss
+after = rss_kb()
+print(len(g.entries), after - before)
+'''
+
+
+def make_glossary(fname, count, seed=1):
+    rnd = random.Random(seed)
+    words = []
+    data = os.path.join(REPO_ROOT, 'langkit', 'data')
+    for name in ['nouns', 'verbs', 'adjectives', 'adverbs']:
+        with open(os.path.join(data, name + '.txt')) as f:
+            words += [w.strip() for w in f if w.strip()]
+    tags = ['n', 'v', 'a', 'ad', 'prep', 'conj']
+    kinds = ['', '', '', '~', ':', '>', '<']
+    syllables = ['ka', 'to', 'mi', 'se', 'pu', 'ra', 'no', 'li', 'xe', 'vo']
+    with open(fname, 'wt') as f:
+        f.write('lemma | tags | definition | notes\n--- | --- | --- | ---\n')
+        lemmas = set()
+        while len(lemmas) < count:
+            lemmas.add(''.join(rnd.choice(syllables) for _ in range(rnd.randint(2, 5))))
+        for lemma in sorted(lemmas):
+            equivs = []
+            for _ in range(rnd.randint(1, 4)):
+                gloss = ' '.join(rnd.choice(words) for _ in range(rnd.randint(1, 3)))
+                if rnd.random() < 0.2:
+                    gloss += f' ({rnd.choice(words)} sense)'
+                equivs.append(rnd.choice(kinds) + gloss)
+            notes = rnd.choice(words) if rnd.random() < 0.1 else ''
+            f.write(f"{lemma} | {rnd.choice(tags)} | {' / '.join(equivs)} | {notes}\n")
+
+
+def measure(root, fname):
+    out = subprocess.check_output([sys.executable, '-c', CHILD, root, fname], text=True)
+    count, kb = out.split()
+    return int(count), int(kb)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--compare', help="another langkit checkout to measure as a baseline")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        fname = os.path.join(tmp, 'glossary.md')
+        make_glossary(fname, args.entries)
+        roots = [('this tree', REPO_ROOT)]
+        if args.compare:
+            roots.insert(0, ('baseline', os.path.abspath(args.compare)))
+        results = []
+        for label, root in roots:
+            count, kb = measure(root, fname)
+            results.append(kb)
+            print(f"{label}: {count} entries, RSS grew {kb / 1024:.1f} MiB ({kb * 1024 / count:.0f} bytes/entry)")
+        if len(results) == 2:
+            print(f"change: {100.0 * (results[1] - results[0]) / results[0]:+.1f}%")
+
+
+if __name__ == '__main__':
+    main()
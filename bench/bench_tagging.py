@@ -0,0 +1,91 @@
+"""
+Compare tagging a document one sentence at a time with nltk.pos_tag()
+against tagging all of its sentences at once with a tagger that is
+loaded once, as TranslationCoach.hints() does.
+
+Generates a few MB of English-like text from the word lists in
+langkit/data, so the numbers are about throughput rather than accuracy.
+
+    python bench/bench_tagging.py --mb 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+MY_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.normpath(os.path.join(MY_FOLDER, '..'))
+sys.path.insert(0, REPO_ROOT)
+
+import nltk
+from nltk.tokenize import word_tokenize, sent_tokenize
+
+from langkit.tagging import pos_tag_sents
+
+DETERMINERS = ['the', 'a', 'this', 'that', 'every', 'some']
+PRONOUNS = ['I', 'you', 'she', 'we', 'they']
+PREPOSITIONS = ['in', 'on', 'with', 'from', 'under', 'after']
+
+
+def make_text(size, seed=1):
+    rnd = random.Random(seed)
+    words = {}
+    data = os.path.join(REPO_ROOT, 'langkit', 'data')
+    for name in ['nouns', 'verbs', 'adjectives', 'adverbs']:
+        with open(os.path.join(data, name + '.txt')) as f:
+            words[name] = [w.strip() for w in f if w.strip()]
+    def noun_phrase():
+        np = [rnd.choice(DETERMINERS)]
+        if rnd.random() < 0.4:
+            np.append(rnd.choice(words['adjectives']))
+        np.append(rnd.choice(words['nouns']))
+        return ' '.join(np)
+    paragraphs = []
+    length = 0
+    while length < size:
+        sentences = []
+        for _ in range(rnd.randint(3, 8)):
+            subject = rnd.choice(PRONOUNS) if rnd.random() < 0.3 else noun_phrase()
+            parts = [subject, rnd.choice(words['verbs']), noun_phrase()]
+            if rnd.random() < 0.3:
+                parts.append(rnd.choice(words['adverbs']))
+            if rnd.random() < 0.5:
+                parts += [rnd.choice(PREPOSITIONS), noun_phrase()]
+            sentence = ' '.join(parts)
+            sentences.append(sentence[0].upper() + sentence[1:] + '.')
+        paragraph = ' '.join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return paragraphs
+
+
+def tag_each(paragraphs):
+    for paragraph in paragraphs:
+        for sentence in sent_tokenize(paragraph):
+            nltk.pos_tag(word_tokenize(sentence))
+
+
+def tag_batched(paragraphs):
+    for paragraph in paragraphs:
+        pos_tag_sents([word_tokenize(sentence) for sentence in sent_tokenize(paragraph)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mb', type=float, default=4.0, help="megabytes of text to tag")
+    args = parser.parse_args()
+    paragraphs = make_text(int(args.mb * 1024 * 1024))
+    mb = sum(len(p) for p in paragraphs) / (1024 * 1024)
+    results = []
+    for label, func in [('nltk.pos_tag per sentence', tag_each), ('pos_tag_sents per paragraph', tag_batched)]:
+        start = time.perf_counter()
+        func(paragraphs)
+        elapsed = time.perf_counter() - start
+        results.append(elapsed)
+        print(f"{label}: {elapsed:.1f}s, {mb / elapsed:.2f} MB/s")
+    print(f"speedup: {results[0] / results[1]:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Time single inserts, edits and deletes on a large synthetic glossary
+whose indexes are already built, the way REPL changes, watcher patches
+and journal replays make them.
+
+    python bench/bench_writes.py --entries 60000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+MY_FOLDER = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.normpath(os.path.join(MY_FOLDER, '..')))
+sys.path.insert(0, MY_FOLDER)
+
+from bench_memory import make_glossary
+from langkit.glossary import Entry, Glossary
+
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print(f"{count} {label}: {elapsed:.3f}s ({elapsed * 1000 / count:.2f} ms each)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=60000)
+    parser.add_argument('--count', type=int, default=50)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        fname = os.path.join(tmp, 'glossary.md')
+        make_glossary(fname, args.entries)
+        g = Glossary.load(fname)
+        # Build the indexes a search would, so writes have to maintain them.
+        g.find('d:water')
+        g.find('d:*ate*')
+        g.stats
+        added = []
+        timed('inserts', args.count, lambda i: added.append(g.insert(Entry((f"zz{i}", "n", f"a new word {i}", "")))))
+        added = [e for e in g.entries if e.lemma.startswith('zz')]
+        timed('edits', args.count, lambda i: g.edit(added[i], notes=f"edited {i}"))
+        added = [e for e in g.entries if e.lemma.startswith('zz')]
+        timed('deletes', args.count, lambda i: g.delete(added[i]))
+
+
+if __name__ == '__main__':
+    main()
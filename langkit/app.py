@@ -1,7 +1,11 @@
 import os
 import sys
+import time
 import traceback
 
+# When lk started importing its own modules, for --profile-startup.
+_IMPORT_START = time.perf_counter()
+
 from .commands import help, PLUGINS
 from .lang import Lang
 from .ui import *
@@ -15,10 +19,31 @@ Available commands
 """)
     for name, func in PLUGINS.items():
         doc = func.__doc__.strip()
-        i = doc.find('-')
+        i = doc.find('- ')
         syntax, doc = doc[:i].rstrip(), doc[i+1:].lstrip()
         print(f"  lk LANGDIR {name} {syntax}\n      {doc}\n")
     print("  lk help [cmd]\n      display general help, or help on a specific command\n")
+    print("  lk --profile-startup LANGDIR [cmd]\n      report how long each phase of startup takes, then run cmd\n")
+
+class StartupProfile:
+    """
+    Times the phases of starting up, and reports them on stderr.
+    """
+    def __init__(self, start):
+        self.phases = []
+        self.last = start
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        total = sum(elapsed for _, elapsed in self.phases)
+        lines = [f"  {phase:<20} {elapsed * 1000:8.1f} ms" for phase, elapsed in self.phases]
+        lines.append(f"  {'total':<20} {total * 1000:8.1f} ms")
+        lines.append(f"  nltk loaded: {'yes' if 'nltk' in sys.modules else 'no'}")
+        sys.stderr.write("startup profile:\n" + "\n".join(lines) + "\n")
 
 def match_command(which):
     for name, func in PLUGINS.items():
@@ -29,10 +54,15 @@ def main(argv = None):
     if not argv:
         argv = sys.argv
 
-    # Record verbose flag and remove it, if present.
-    if len(argv) > 1 and argv[1] == '-v':
-        set_verbose(True)
-        argv = argv[1:]
+    profile = None
+    # Record verbose and profiling flags and remove them, if present.
+    while len(argv) > 1 and argv[1] in ('-v', '--profile-startup'):
+        if argv[1] == '-v':
+            set_verbose(True)
+        else:
+            profile = StartupProfile(_IMPORT_START)
+            profile.mark('import lk')
+        argv = argv[:1] + argv[2:]
 
     show_help = len(argv) < 2
     if not show_help:
@@ -43,6 +73,11 @@ def main(argv = None):
             lang = Lang(argv[1])
             if len(argv) == 2: argv.append("repl")
             cmd = match_command(argv[2])
+            if profile:
+                profile.mark('load language')
+                lang.glossary
+                profile.mark('load glossary')
+                profile.report()
             if cmd:
                 cmd(lang, *argv[3:])
             else:
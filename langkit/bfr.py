@@ -1,209 +1,207 @@
-import bisect
+import os
+from types import MappingProxyType
 
-irregular_past_parts = [
-    ("awoken", "awake"),
-    ("been", "be"),
-    ("begotten", "beget"),
-    ("begun", "begin"),
-    ("bent", "bend"),
-    ("bitten", "bite"),
-    ("bought", "buy"),
-    ("bound", "bind"),
-    ("broken", "break"),
-    ("built", "build"),
-    ("burnt", "burn"),
-    ("caught", "catch"),
-    ("chosen", "choose"),
-    ("done", "do"),
-    ("driven", "drive"),
-    ("dwelt", "dwell"),
-    ("eaten", "eat"),
-    ("fallen", "fall"),
-    ("fed", "feed"),
-    ("felt", "feel"),
-    ("fled", "flee"),
-    ("flown", "fly"),
-    ("forgotten", "forget"),
-    ("found", "find"),
-    ("frozen", "freeze"),
-    ("given", "give"),
-    ("gone", "go"),
-    ("ground", "grind"),
-    ("heard", "hear"),
-    ("held", "hold"),
-    ("hidden", "hide"),
-    ("knelt", "kneel"),
-    ("known", "know"),
-    ("laid", "lay"),
-    ("lain", "lie"),
-    ("lit", "light"),
-    ("meant", "mean"),
-    ("overcome", "overcome"),
-    ("overthrown", "overthrow"),
-    ("paid", "pay"),
-    ("pleaded", "plead"),
-    ("proven", "prove"),
-    ("ridden", "ride"),
-    ("risen", "rise"),
-    ("sawn", "saw"),
-    ("seen", "see"),
-    ("sent", "send"),
-    ("shaken", "shake"),
-    ("shone", "shine"),
-    ("shorn", "shear"),
-    ("shot", "shoot"),
-    ("shown", "show"),
-    ("slain", "slay"),
-    ("slept", "sleep"),
-    ("slid", "slide"),
-    ("smelt", "smell"),
-    ("sown", "sow"),
-    ("spent", "spend"),
-    ("spilt", "spill"),
-    ("spoilt", "spoil"),
-    ("spoken", "speak"),
-    ("stolen", "steal"),
-    ("stood", "stand"),
-    ("stridden", "stride"),
-    ("struck", "strike"),
-    ("stuck", "stick"),
-    ("sung", "sing"),
-    ("swept", "sweep"),
-    ("swollen", "swell"),
-    ("sworn", "swear"),
-    ("swum", "swim"),
-    ("taken", "take"),
-    ("taught", "teach"),
-    ("thought", "think"),
-    ("thrown", "throw"),
-    ("told", "tell"),
-    ("torn", "tear"),
-    ("understood", "understand"),
-    ("wept", "weep"),
-    ("woken", "wake"),
-    ("won", "win"),
-    ("worn", "wear"),
-    ("wound", "wind"),
-    ("written", "write"),
-]
+# Inflected form -> base form. These are read-only; add new verbs here.
+irregular_past_parts = MappingProxyType({
+    "awoken": "awake",
+    "been": "be",
+    "begotten": "beget",
+    "begun": "begin",
+    "bent": "bend",
+    "bitten": "bite",
+    "bought": "buy",
+    "bound": "bind",
+    "broken": "break",
+    "built": "build",
+    "burnt": "burn",
+    "caught": "catch",
+    "chosen": "choose",
+    "done": "do",
+    "driven": "drive",
+    "dwelt": "dwell",
+    "eaten": "eat",
+    "fallen": "fall",
+    "fed": "feed",
+    "felt": "feel",
+    "fled": "flee",
+    "flown": "fly",
+    "forgotten": "forget",
+    "found": "find",
+    "frozen": "freeze",
+    "given": "give",
+    "gone": "go",
+    "ground": "grind",
+    "heard": "hear",
+    "held": "hold",
+    "hidden": "hide",
+    "knelt": "kneel",
+    "known": "know",
+    "laid": "lay",
+    "lain": "lie",
+    "lit": "light",
+    "meant": "mean",
+    "overcome": "overcome",
+    "overthrown": "overthrow",
+    "paid": "pay",
+    "pleaded": "plead",
+    "proven": "prove",
+    "ridden": "ride",
+    "risen": "rise",
+    "sawn": "saw",
+    "seen": "see",
+    "sent": "send",
+    "shaken": "shake",
+    "shone": "shine",
+    "shorn": "shear",
+    "shot": "shoot",
+    "shown": "show",
+    "slain": "slay",
+    "slept": "sleep",
+    "slid": "slide",
+    "smelt": "smell",
+    "sown": "sow",
+    "spent": "spend",
+    "spilt": "spill",
+    "spoilt": "spoil",
+    "spoken": "speak",
+    "stolen": "steal",
+    "stood": "stand",
+    "stridden": "stride",
+    "struck": "strike",
+    "stuck": "stick",
+    "sung": "sing",
+    "swept": "sweep",
+    "swollen": "swell",
+    "sworn": "swear",
+    "swum": "swim",
+    "taken": "take",
+    "taught": "teach",
+    "thought": "think",
+    "thrown": "throw",
+    "told": "tell",
+    "torn": "tear",
+    "understood": "understand",
+    "wept": "weep",
+    "woken": "wake",
+    "won": "win",
+    "worn": "wear",
+    "wound": "wind",
+    "written": "write",
+})
 
-irregular_past = [
-    ("ate", "eat"),
-    ("began", "begin"),
-    ("begat", "beget"),
-    ("bit", "bite"),
-    ("bought", "buy"),
-    ("broke", "break"),
-    ("brought", "bring"),
-    ("built", "build"),
-    ("came", "come"),
-    ("caught", "catch"),
-    ("chose", "choose"),
-    ("dealt", "deal"),
-    ("did", "do"),
-    ("drank", "drink"),
-    ("dreamt", "dream"),
-    ("drew", "draw"),
-    ("drove", "drive"),
-    ("fed", "feed"),
-    ("fell", "fall"),
-    ("felt", "feel"),
-    ("flew", "fly"),
-    ("forgave", "forgive"),
-    ("forgot", "forget"),
-    ("fought", "fight"),
-    ("found", "find"),
-    ("froze", "freeze"),
-    ("gave", "give"),
-    ("got", "get"),
-    ("grew", "grow"),
-    ("had", "have"),
-    ("heard", "hear"),
-    ("held", "hold"),
-    ("hid", "hide"),
-    ("hit", "hit"),
-    ("hung", "hang"),
-    ("hurt", "hurt"),
-    ("kept", "keep"),
-    ("knew", "know"),
-    ("laid", "lay"),
-    ("led", "lead"),
-    ("left", "leave"),
-    ("lent", "lend"),
-    ("let", "let"),
-    ("lit", "light"),
-    ("lost", "lose"),
-    ("made", "make"),
-    ("meant", "mean"),
-    ("met", "meet"),
-    ("paid", "pay"),
-    ("put", "put"),
-    ("ran", "run"),
-    ("rang", "ring"),
-    ("read", "read"),
-    ("rode", "ride"),
-    ("rose", "rise"),
-    ("said", "say"),
-    ("sang", "sing"),
-    ("sank", "sink"),
-    ("sat", "sit"),
-    ("saw", "see"),
-    ("sent", "send"),
-    ("set", "set"),
-    ("shone", "shine"),
-    ("shook", "shake"),
-    ("shot", "shoot"),
-    ("showed", "show"),
-    ("shut", "shut"),
-    ("slept", "sleep"),
-    ("slew", "slay"),
-    ("slid", "slide"),
-    ("smelt", "smell"),
-    ("sold", "sell"),
-    ("sought", "seek"),
-    ("sowed", "sow"),
-    ("spat", "spit"),
-    ("spent", "spend"),
-    ("spoke", "speak"),
-    ("spread", "spread"),
-    ("spun", "spin"),
-    ("stole", "steal"),
-    ("stood", "stand"),
-    ("struck", "strike"),
-    ("stuck", "stick"),
-    ("stung", "sting"),
-    ("stunk", "stink"),
-    ("swam", "swim"),
-    ("swept", "sweep"),
-    ("swore", "swear"),
-    ("swung", "swing"),
-    ("taught", "teach"),
-    ("thought", "think"),
-    ("threw", "throw"),
-    ("told", "tell"),
-    ("took", "take"),
-    ("tore", "tear"),
-    ("understood", "understand"),
-    ("was", "be"),
-    ("went", "go"),
-    ("wept", "weep"),
-    ("were", "be"),
-    ("withdrew", "withdraw"),
-    ("woke", "wake"),
-    ("won", "win"),
-    ("wore", "wear"),
-    ("wound", "wind"),
-    ("wrote", "write"),
-    ("wrung", "wring"),
-]
+irregular_past = MappingProxyType({
+    "ate": "eat",
+    "began": "begin",
+    "begat": "beget",
+    "bit": "bite",
+    "bought": "buy",
+    "broke": "break",
+    "brought": "bring",
+    "built": "build",
+    "came": "come",
+    "caught": "catch",
+    "chose": "choose",
+    "dealt": "deal",
+    "did": "do",
+    "drank": "drink",
+    "dreamt": "dream",
+    "drew": "draw",
+    "drove": "drive",
+    "fed": "feed",
+    "fell": "fall",
+    "felt": "feel",
+    "flew": "fly",
+    "forgave": "forgive",
+    "forgot": "forget",
+    "fought": "fight",
+    "found": "find",
+    "froze": "freeze",
+    "gave": "give",
+    "got": "get",
+    "grew": "grow",
+    "had": "have",
+    "heard": "hear",
+    "held": "hold",
+    "hid": "hide",
+    "hit": "hit",
+    "hung": "hang",
+    "hurt": "hurt",
+    "kept": "keep",
+    "knew": "know",
+    "laid": "lay",
+    "led": "lead",
+    "left": "leave",
+    "lent": "lend",
+    "let": "let",
+    "lit": "light",
+    "lost": "lose",
+    "made": "make",
+    "meant": "mean",
+    "met": "meet",
+    "paid": "pay",
+    "put": "put",
+    "ran": "run",
+    "rang": "ring",
+    "read": "read",
+    "rode": "ride",
+    "rose": "rise",
+    "said": "say",
+    "sang": "sing",
+    "sank": "sink",
+    "sat": "sit",
+    "saw": "see",
+    "sent": "send",
+    "set": "set",
+    "shone": "shine",
+    "shook": "shake",
+    "shot": "shoot",
+    "showed": "show",
+    "shut": "shut",
+    "slept": "sleep",
+    "slew": "slay",
+    "slid": "slide",
+    "smelt": "smell",
+    "sold": "sell",
+    "sought": "seek",
+    "sowed": "sow",
+    "spat": "spit",
+    "spent": "spend",
+    "spoke": "speak",
+    "spread": "spread",
+    "spun": "spin",
+    "stole": "steal",
+    "stood": "stand",
+    "struck": "strike",
+    "stuck": "stick",
+    "stung": "sting",
+    "stunk": "stink",
+    "swam": "swim",
+    "swept": "sweep",
+    "swore": "swear",
+    "swung": "swing",
+    "taught": "teach",
+    "thought": "think",
+    "threw": "throw",
+    "told": "tell",
+    "took": "take",
+    "tore": "tear",
+    "understood": "understand",
+    "was": "be",
+    "went": "go",
+    "wept": "weep",
+    "were": "be",
+    "withdrew": "withdraw",
+    "woke": "wake",
+    "won": "win",
+    "wore": "wear",
+    "wound": "wind",
+    "wrote": "write",
+    "wrung": "wring",
+})
 
 def find_regular(pairs, irregular):
-    index = bisect.bisect_left(pairs, (irregular, ""))
-    if index != len(pairs):
-        found = pairs[index]
-        if found[0] == irregular:
-            return found[1]
-        
+    return pairs.get(irregular)
+
 
 vowels = "aeiou"
 two_vowels_plus_cons_with_silent_e = ['iev', 'eiv', 'eas', 'aus', 'uad', 'iat']
@@ -218,14 +216,103 @@ def likely_silent_e(verb_root):
                 return verb_root[-3] not in vowels
     return False
 
+def _ends_cvc(word):
+    # Short words like stop and big double their last consonant: stopped, bigger.
+    return (len(word) >= 3 and word[-1] not in vowels + 'wxy' and word[-2] in vowels
+            and word[-3] not in vowels and sum(c in vowels for c in word) == 1)
+
+def _add_s(word):
+    if word.endswith(('s', 'x', 'z', 'ch', 'sh', 'o')):
+        return word + 'es'
+    if word.endswith('y') and word[-2:-1] not in vowels:
+        return word[:-1] + 'ies'
+    return word + 's'
+
+def _add_suffix(word, suffix):
+    """Add a suffix that starts with a vowel, such as ed, ing or er."""
+    if word.endswith('ie') and suffix == 'ing':
+        return word[:-2] + 'ying'
+    if word.endswith('e') and not word.endswith(('ee', 'ye', 'oe')):
+        return word[:-1] + suffix
+    if word.endswith('e'):
+        return word + suffix[1:] if suffix[0] == 'e' else word + suffix
+    if word.endswith('y') and word[-2:-1] not in vowels and suffix != 'ing':
+        return word[:-1] + 'i' + suffix
+    if _ends_cvc(word):
+        return word + word[-1] + suffix
+    return word + suffix
+
+def _add_ly(word):
+    if word.endswith('y') and word[-2:-1] not in vowels:
+        return word[:-1] + 'ily'
+    if word.endswith('le'):
+        return word[:-1] + 'y'
+    if word.endswith('ic'):
+        return word + 'ally'
+    return word + 'ly'
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+def read_word_list(name):
+    """The words in one of the lists in DATA_FOLDER, such as 'verbs'."""
+    with open(os.path.join(DATA_FOLDER, name + '.txt'), 'rt') as f:
+        return [line.strip().lower() for line in f if line.strip()]
+
+def _build_lexicon():
+    """
+    Map nltk parts of speech to {inflected word: (base form, lk pos)}, for
+    the irregular verbs above and for regular inflections of the words in
+    the lists in DATA_FOLDER.
+    """
+    lexicon = {tag: {} for tag in ['NNS', 'VBD', 'VBG', 'VBN', 'VBP', 'VBZ', 'JJR', 'JJS', 'RB']}
+    def add(tag, word, base, lk_pos):
+        # Irregular forms are added first, and always win.
+        lexicon[tag].setdefault(word, (base, lk_pos))
+    for tag, table in [('VBD', irregular_past), ('VBN', irregular_past_parts)]:
+        for word, base in table.items():
+            add(tag, word, base, 'v')
+    add('VBP', 'am', 'be', 'v')
+    add('VBP', 'are', 'be', 'v')
+    add('VBZ', 'is', 'be', 'v')
+    add('VBZ', 'has', 'have', 'v')
+    add('VBG', 'being', 'be', 'v')
+    for word, base in [('men', 'man'), ('women', 'woman'), ('children', 'child'), ('people', 'person'),
+                       ('feet', 'foot'), ('teeth', 'tooth'), ('mice', 'mouse'), ('lives', 'life')]:
+        add('NNS', word, base, 'n')
+    for tag, word, base in [('JJR', 'better', 'good'), ('JJS', 'best', 'good'),
+                            ('JJR', 'worse', 'bad'), ('JJS', 'worst', 'bad')]:
+        add(tag, word, base, 'ad')
+    irregular_bases = set(irregular_past.values()) | set(irregular_past_parts.values())
+    for verb in read_word_list('verbs'):
+        if verb == 'be':
+            continue
+        if verb not in irregular_bases:
+            add('VBD', _add_suffix(verb, 'ed'), verb, 'v')
+            add('VBN', _add_suffix(verb, 'ed'), verb, 'v')
+        add('VBG', _add_suffix(verb, 'ing'), verb, 'v')
+        add('VBZ', _add_s(verb), verb, 'v')
+    for noun in read_word_list('nouns'):
+        add('NNS', _add_s(noun), noun, 'n')
+    for adjective in read_word_list('adjectives'):
+        add('JJR', _add_suffix(adjective, 'er'), adjective, 'ad')
+        add('JJS', _add_suffix(adjective, 'est'), adjective, 'ad')
+        add('RB', _add_ly(adjective), adjective, 'ad')
+    return MappingProxyType({tag: MappingProxyType(words) for tag, words in lexicon.items()})
+
+LEXICON = _build_lexicon()
+_NO_WORDS = MappingProxyType({})
+
 def bfr(word, pos):
     """
     Generate possible base forms of a word, and a new part of speech, given
     the inflected word and its nltk part of speech.
 
     This algorithm is very crude. It only aims to increase the success
-    of glossary lookup a modest amount.
+    of glossary lookup a modest amount. Words in LEXICON are looked up
+    there; the rules below only have to deal with the rest.
     """
+    found = LEXICON.get(pos, _NO_WORDS).get(word)
+    if found: return found
     if pos == 'VBD': # verb past tense: gave, walked
         regular = find_regular(irregular_past, word)
         if regular: return (regular, 'v')
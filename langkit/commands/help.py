@@ -17,7 +17,7 @@ Available commands
         PLUGINS['help'] = cmd
     for name, func in PLUGINS.items():
         doc = func.__doc__.strip()
-        i = doc.find('-')
+        i = doc.find('- ')
         syntax, doc = doc[:i].rstrip(), doc[i+1:].lstrip()
         print("  lk lang %s %s\n      %s\n" % (name, syntax, doc))
 
@@ -3,7 +3,7 @@ import re
 import traceback
 
 from ..ui import *
-from ..glossary import Entry, Defn, Glossary
+from ..glossary import Entry, Defn
 from ..tcoach import *
 
 
@@ -39,15 +39,21 @@ def show_hits(ctx, which=None, with_number=True):
 
 def delete(ctx, entry):
     g = ctx.lang.glossary
-    g.entries.remove(entry)
-    g._stats = None
-    g.save(force=True)
+    try:
+        g.delete(entry)
+    except ValueError as e:
+        # A layered glossary can't delete what a lower layer owns.
+        warn(str(e))
+        return
+    g.save()
     print(f"Deleted {entry.lemma}.")
 
 def edit(ctx, entry):
     g = ctx.lang.glossary
+    # Collect changes first and apply them all at once, so that abandoning
+    # the edit partway through leaves the entry untouched.
+    changes = {}
     try:
-        changed = False
         write('\n')
         new = prompt_options(f"   lex: {entry.lemma}")
         if new and new != entry.lemma: 
@@ -55,37 +61,32 @@ def edit(ctx, entry):
             if redundant:
                 warn("Edit would overwrite {lex} entry that already exists.")
                 return
-            changed = entry.lemma = new
-            # Since lemma has changed, it may sort differently.
-            # Take it out of glossary entry list, then re-add it
-            # to maintain proper sort order.
-            g.entries.remove(entry)
-            g.insert(entry)
+            changes['lemma'] = new
         new = prompt_options(f"   tags: {' '.join(entry.tags)}")
-        if new: changed = entry.tags = new.split()
+        if new: changes['tags'] = new.split()
         new = prompt_options(f"   defn: {entry.defn} (/ to append)")
         if new:
             if new.startswith('/'):
                 new = str(entry.defn) + ' ' + new 
-            changed = entry.defn = Defn(new)
+            changes['defn'] = Defn(new)
         notes = entry.notes if entry.notes else '.'
         new = prompt_options(f"   notes: {notes} (. = none)")
         if new:
             if new == '.': 
-                new = ''
-                changed = bool(entry.notes)
+                if entry.notes:
+                    changes['notes'] = ''
             else:
-                changed = True
-            entry.notes = new
+                changes['notes'] = new
     except KeyboardInterrupt:
-        # Undo whatever edit(s) we made.
-        if changed:
-            ctx.lang.glossary = Glossary.load(g.fname)
-            changed = False
+        changes = {}
     print()
-    if changed:
-        g.save(force=True)
-        g._stats = None
+    if changes:
+        try:
+            entry = g.edit(entry, **changes)
+        except ValueError as e:
+            warn(str(e))
+            return
+        g.save()
         show_hits(ctx, [entry], with_number=False)
     else:
         print("Abandoned edit.")
@@ -141,6 +142,8 @@ find <expr> - lookup data in glossary
 
   expr can be a simple string to query lemma+def, or can reference specific fields (lemma: pos: defn: notes: or short forms thereof) 
 
+  start expr with ~ to find words that are spelled almost the same, as in ~d:recieve
+
 add [lemma [pos [defn [notes]]]] - add a glossary entry
 
 edit [number or lemma] - edit a glossary entry
@@ -282,16 +285,19 @@ def get_entry_from_args(ctx, args):
 
 def give_hints(coach, text):
     print()
+    show_hints(coach.hints(text))
+
+def show_hints(hints, flush=False):
     verbose = get_verbose()
     column = 1
     width = get_terminal_size()[0]
-    for hint in coach.hints(text):
+    for hint in hints:
         if verbose:
             out = repr(hint) + ' '
         else:
             out = hint.lemma if hint.lemma else str(hint)
             if column + len(out) >= width:
-                print()
+                print(flush=flush)
                 column = 1
             if column > 1:
                 write(' ')
@@ -306,7 +312,8 @@ def give_hints(coach, text):
 
 def trans(ctx, args):
     if ctx.tcoach is None:
-        ctx.tcoach = TranslationCoach(ctx.lang.glossary, ctx.lang.advise_func)
+        ctx.tcoach = TranslationCoach(ctx.lang.glossary, ctx.lang.advise_func, backend=ctx.lang.tagger,
+                                      rewrite_rules=ctx.lang.rewrite_rules)
     coach = ctx.tcoach
     if not args:
         if ctx.last_trans:
@@ -0,0 +1,33 @@
+import os
+import sys
+
+from ..tcoach import TranslationCoach
+from .repl import give_hints, show_hints
+
+
+def cmd(lang, *args):
+    """
+    [--stream] FILE|-|TEXT - show translation hints for a file, stdin (-) or some text
+    """
+    args = list(args)
+    stream = '--stream' in args
+    if stream:
+        args.remove('--stream')
+    if not args:
+        raise ValueError("Nothing to translate; give a file, - for stdin, or some text.")
+    coach = TranslationCoach(lang.glossary, lang.advise_func, backend=lang.tagger,
+                             rewrite_rules=lang.rewrite_rules)
+    if len(args) == 1 and (args[0] == '-' or os.path.isfile(args[0])):
+        f = sys.stdin if args[0] == '-' else open(args[0], 'rt')
+        try:
+            if stream:
+                # Hints come out as the text is read, so a book or a pipe
+                # never has to fit in memory all at once.
+                show_hints(coach.hints_stream(f), flush=True)
+            else:
+                give_hints(coach, f.read())
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    else:
+        give_hints(coach, ' '.join(args))
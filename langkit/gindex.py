@@ -0,0 +1,486 @@
+"""
+Derived indexes that let Glossary.find narrow its search before doing
+any per-entry regex matching.
+
+Indexes hold stable integer ids rather than list positions, since
+positions shift every time an entry is inserted or deleted. Every
+lookup returns a superset of the entries that can match; the caller
+is expected to verify survivors against the full search expression.
+
+Once an index is in use by readers, it isn't changed. Writers change a
+copy(), which shares its tables and postings with the original until it
+has to change them.
+"""
+import bisect
+import re
+import threading
+import time
+
+from .symdel import DeleteIndex
+
+_TOKEN_PAT = re.compile(r'\w+')
+
+# MatchExpr turns a wildcarded expression into a regex without escaping
+# anything except parentheses. If one of these characters shows up, we
+# can't reason about what the regex will accept, so we don't narrow.
+_UNSAFE_CHARS = set('.^$+{}[]\\|')
+_WILDCARDS = '*?!'
+
+# An _Overlay's changes are folded into a new base once there are this
+# many, which bounds what each copy() has to copy.
+FOLD_AT = 1024
+
+_GONE = object()
+
+
+class _Overlay:
+    """
+    A dict made of a base dict, which copies share and never change, and
+    this copy's own changes on top of it; a deleted key maps to _GONE in
+    the changes. Copying one only copies its changes, until there are
+    enough of them to be worth folding into a new base. Values can't be
+    None.
+    """
+    __slots__ = ('base', 'changes', 'size')
+
+    def __init__(self, base=None):
+        self.base = {} if base is None else base
+        self.changes = {}
+        self.size = len(self.base)
+
+    def copy(self):
+        changes = self.changes
+        if len(changes) < FOLD_AT and len(changes) <= len(self.base):
+            other = _Overlay(self.base)
+            other.changes = dict(changes)
+            other.size = self.size
+            return other
+        base = dict(self.base)
+        for key, value in changes.items():
+            if value is _GONE:
+                del base[key]
+            else:
+                base[key] = value
+        return _Overlay(base)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        value = self.changes.get(key)
+        if value is None:
+            return key in self.base
+        return value is not _GONE
+
+    def __getitem__(self, key):
+        value = self.changes.get(key)
+        if value is None:
+            return self.base[key]
+        if value is _GONE:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = self.changes.get(key)
+        if value is None:
+            return self.base.get(key, default)
+        return default if value is _GONE else value
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self.size += 1
+        self.changes[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in self.base:
+            self.changes[key] = _GONE
+        else:
+            del self.changes[key]
+        self.size -= 1
+
+    def pop(self, key, *default):
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = self[key]
+        del self[key]
+        return value
+
+    def keys(self):
+        changes = self.changes
+        gone = [key for key, value in changes.items() if value is _GONE]
+        keys = self.base.keys() - gone if gone else set(self.base)
+        keys.update(key for key, value in changes.items() if value is not _GONE)
+        return keys
+
+    def items(self):
+        changes = self.changes
+        for key, value in self.base.items():
+            if key not in changes:
+                yield key, value
+        for key, value in changes.items():
+            if value is not _GONE:
+                yield key, value
+
+
+def bit_ids(bits):
+    """Turn a bitmap of entry ids into a set of ids."""
+    ids = set()
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for i, byte in enumerate(data):
+        if byte:
+            base = i * 8
+            for j in range(8):
+                if byte & (1 << j):
+                    ids.add(base + j)
+    return ids
+
+
+def ids_bits(ids):
+    """Turn ids into a bitmap, without building up a big int one bit at a time."""
+    data = bytearray((max(ids) >> 3) + 1 if ids else 0)
+    for id in ids:
+        data[id >> 3] |= 1 << (id & 7)
+    return int.from_bytes(data, 'little')
+
+
+def tokenize(txt):
+    return _TOKEN_PAT.findall(txt.lower())
+
+
+def trigrams(txt):
+    txt = txt.lower()
+    return {txt[i:i+3] for i in range(len(txt) - 2)}
+
+
+def literal_runs(expr):
+    """
+    The literal stretches of a wildcarded MatchExpr, lowercased, or None
+    if the expression can't be reasoned about.
+    """
+    if _UNSAFE_CHARS.intersection(expr):
+        return None
+    return [run.lower() for run in re.split('[*?!]', expr) if run]
+
+
+def literal_terms(expr, wildcarded):
+    """
+    Work out which whole tokens and which token prefixes any text matched
+    by a MatchExpr must contain. Returns (tokens, prefixes), or None if the
+    expression can't be reasoned about.
+    """
+    if not wildcarded:
+        # Without wildcards, the expression has to equal the text exactly.
+        return tokenize(expr), []
+    if _UNSAFE_CHARS.intersection(expr):
+        return None
+    tokens = []
+    prefixes = []
+    # Walk the literal segments between wildcards. The regex is anchored
+    # at the start of the text (re.match) but not at the end.
+    left = None
+    i = 0
+    n = len(expr)
+    while i <= n:
+        j = i
+        while j < n and expr[j] not in _WILDCARDS:
+            j += 1
+        right = expr[j] if j < n else None
+        seg = expr[i:j]
+        for m in _TOKEN_PAT.finditer(seg):
+            start_bounded = m.start() > 0 or left is None or left == '!'
+            end_bounded = m.end() < len(seg) or right == '!'
+            if start_bounded:
+                token = m.group().lower()
+                (tokens if end_bounded else prefixes).append(token)
+        left = right
+        i = j + 1
+    return tokens, prefixes
+
+
+class GlossaryIndex:
+    """
+    Maps normalized definition tokens to the ids of the entries whose
+    equivalents contain them, lowercased glosses to the ids of entries
+    that have them, and tags to bitmaps of entry ids. For
+    patterns with leading or inner wildcards, it also keeps trigrams of
+    lemmas, equivalents and notes; those are built the first time such
+    a pattern shows up. Likewise, symmetric-delete indexes of lemmas and
+    glosses for approximate search are built the first time they're
+    needed.
+    """
+    def __init__(self, entries=None):
+        self._next_id = 0
+        self.ids = {}
+        self.by_id = {}
+        self.tokens = {}
+        self.vocab = []
+        self.tags = {}
+        self.glosses = {}
+        self._keys = {}
+        self._grams = None
+        self._near = None
+        self._near_builder = None
+        # Ids of the posting sets this index may change in place, or None
+        # if it shares none with another index.
+        self._owned = None
+        if entries:
+            # Setting one bit at a time in a growing int is quadratic, so
+            # gather each tag's ids first and make its bitmap in one go.
+            tag_ids = {}
+            for entry in entries:
+                id = self.add(entry, tag_bits=False)
+                for tag in entry.tags:
+                    tag_ids.setdefault(tag, []).append(id)
+            for tag, ids in tag_ids.items():
+                self.tags[tag] = ids_bits(ids)
+        # Built as plain dicts, which are quicker to fill, then wrapped so
+        # that copies can share them.
+        self.ids = _Overlay(self.ids)
+        self.by_id = _Overlay(self.by_id)
+        self.tokens = _Overlay(self.tokens)
+        self.glosses = _Overlay(self.glosses)
+        self._keys = _Overlay(self._keys)
+
+    @property
+    def count(self):
+        return len(self.ids)
+
+    def copy(self):
+        """
+        An index that can be changed without disturbing readers of this
+        one. Tables only copy their recent changes, and postings are copied
+        the first time the new index changes them. Approximate search
+        indexes are shared; see near_ids().
+        """
+        other = GlossaryIndex()
+        other._next_id = self._next_id
+        other.ids = self.ids.copy()
+        other.by_id = self.by_id.copy()
+        other.tokens = self.tokens.copy()
+        other.vocab = list(self.vocab)
+        other.tags = dict(self.tags)
+        other.glosses = self.glosses.copy()
+        other._keys = self._keys.copy()
+        if self._grams is not None:
+            other._grams = {field: postings.copy() for field, postings in self._grams.items()}
+            other._no_notes = self._no_notes.copy()
+        other._near = self._near
+        other._near_builder = self._near_builder
+        other._owned = set()
+        return other
+
+    def _posting(self, table, key):
+        """The posting for key in table, safe to change in place."""
+        posting = table.get(key)
+        if posting is None:
+            posting = table[key] = set()
+        elif self._owned is not None and id(posting) not in self._owned:
+            posting = table[key] = set(posting)
+        else:
+            return posting
+        if self._owned is not None:
+            self._owned.add(id(posting))
+        return posting
+
+    def add(self, entry, tag_bits=True):
+        id = self._next_id
+        self._next_id += 1
+        self.ids[entry] = id
+        self.by_id[id] = entry
+        keys = set()
+        glosses = set()
+        for item in entry.defn.equivs:
+            keys.update(tokenize(item.value))
+            glosses.add(item.gloss.lower())
+        for gloss in glosses:
+            self._posting(self.glosses, gloss).add(id)
+        for token in keys:
+            if token not in self.tokens:
+                bisect.insort(self.vocab, token)
+            self._posting(self.tokens, token).add(id)
+        if tag_bits:
+            bit = 1 << id
+            for tag in entry.tags:
+                self.tags[tag] = self.tags.get(tag, 0) | bit
+        self._keys[id] = (keys, tuple(entry.tags), glosses)
+        if self._grams is not None:
+            self._add_grams(id, entry)
+        if self._near is not None:
+            self._add_words(id, entry)
+        return id
+
+    def remove(self, entry):
+        # Callers remove an entry before changing it, so its trigrams
+        # can be worked out again here rather than stored.
+        if self._grams is not None:
+            self._remove_grams(self.ids[entry], entry)
+        if self._near is not None:
+            id = self.ids[entry]
+            self._near['l'].discard(entry.lemma.lower(), id)
+            for item in entry.defn.equivs:
+                self._near['d'].discard(item.gloss.lower(), id)
+        id = self.ids.pop(entry)
+        del self.by_id[id]
+        keys, tags, glosses = self._keys.pop(id)
+        for gloss in glosses:
+            ids = self._posting(self.glosses, gloss)
+            ids.discard(id)
+            if not ids:
+                del self.glosses[gloss]
+        for token in keys:
+            posting = self._posting(self.tokens, token)
+            posting.discard(id)
+            if not posting:
+                del self.tokens[token]
+                del self.vocab[bisect.bisect_left(self.vocab, token)]
+        mask = ~(1 << id)
+        for tag in tags:
+            bits = self.tags[tag] & mask
+            if bits:
+                self.tags[tag] = bits
+            else:
+                del self.tags[tag]
+
+    def prefixed(self, prefix):
+        """Ids of entries with any definition token that starts with prefix."""
+        found = set()
+        i = bisect.bisect_left(self.vocab, prefix)
+        while i < len(self.vocab) and self.vocab[i].startswith(prefix):
+            found |= self.tokens[self.vocab[i]]
+            i += 1
+        return found
+
+    def defn_ids(self, match_expr):
+        """
+        Ids of entries that might have an equivalent matching match_expr,
+        or None if the index can't narrow the search.
+        """
+        terms = literal_terms(match_expr.expr, match_expr.wildcarded)
+        if not terms or not (terms[0] or terms[1]):
+            return None
+        tokens, prefixes = terms
+        found = None
+        # Rarest postings first, so intersections stay small.
+        postings = sorted([self.tokens.get(t, set()) for t in set(tokens)], key=len)
+        for posting in postings:
+            found = set(posting) if found is None else found & posting
+            if not found:
+                return found
+        for prefix in set(prefixes):
+            ids = self.prefixed(prefix)
+            found = ids if found is None else found & ids
+            if not found:
+                return found
+        return found
+
+    def tag_bits(self, match_expr):
+        """Bitmap of ids of entries with any tag matching match_expr."""
+        if not match_expr.wildcarded:
+            return self.tags.get(match_expr.expr, 0)
+        bits = 0
+        for tag, tag_bits in self.tags.items():
+            if match_expr.matches(tag):
+                bits |= tag_bits
+        return bits
+
+    def _entry_grams(self, entry):
+        defn_grams = set()
+        for item in entry.defn.equivs:
+            defn_grams |= trigrams(item.value)
+        return {'l': trigrams(entry.lemma), 'd': defn_grams, 'n': trigrams(entry.notes)}
+
+    def _add_grams(self, id, entry, grams=None, no_notes=None):
+        grams = self._grams if grams is None else grams
+        for field, entry_grams in self._entry_grams(entry).items():
+            postings = grams[field]
+            for gram in entry_grams:
+                self._posting(postings, gram).add(id)
+        if not entry.notes:
+            (self._no_notes if no_notes is None else no_notes)[id] = True
+
+    def _remove_grams(self, id, entry):
+        for field, grams in self._entry_grams(entry).items():
+            postings = self._grams[field]
+            for gram in grams:
+                posting = self._posting(postings, gram)
+                posting.discard(id)
+                if not posting:
+                    del postings[gram]
+        self._no_notes.pop(id, None)
+
+    def gram_ids(self, field, match_expr):
+        """
+        Ids of entries whose lemma ('l'), equivalents ('d') or notes ('n')
+        contain every trigram of the literal text in a wildcarded
+        match_expr, or None if it has no literal run long enough to help.
+        """
+        if not match_expr.wildcarded:
+            return None
+        runs = literal_runs(match_expr.expr)
+        grams = set()
+        for run in runs or []:
+            grams |= trigrams(run)
+        if not grams:
+            return None
+        if self._grams is None:
+            # Readers may be using this index, so only show them the
+            # trigrams once they're complete.
+            all_grams = {'l': {}, 'd': {}, 'n': {}}
+            no_notes = {}
+            for id, entry in self.by_id.items():
+                self._add_grams(id, entry, all_grams, no_notes)
+            self._no_notes = _Overlay(no_notes)
+            self._grams = {field: _Overlay(postings) for field, postings in all_grams.items()}
+        postings = self._grams[field]
+        found = None
+        for posting in sorted([postings.get(g, set()) for g in grams], key=len):
+            found = set(posting) if found is None else found & posting
+            if not found:
+                break
+        if field == 'n':
+            # SearchExpr lets entries without notes pass a notes criterion.
+            found |= self._no_notes.keys()
+        return found
+
+    def _add_words(self, id, entry, near=None):
+        near = self._near if near is None else near
+        near['l'].add(entry.lemma.lower(), id)
+        for item in entry.defn.equivs:
+            near['d'].add(item.gloss.lower(), id)
+
+    def _build_near(self, max_distance, deadline):
+        near = {'l': DeleteIndex(max_distance), 'd': DeleteIndex(max_distance)}
+        items = list(self.by_id.items())
+        # Published right away, so that entries added from now on go in
+        # too, and so searches can use it while it fills up.
+        self._near = near
+        for n, (id, entry) in enumerate(items, 1):
+            self._add_words(id, entry, near)
+            if deadline is not None and not n % 256 and time.perf_counter() > deadline:
+                # Finish in the background; until then searches only see
+                # the words added so far.
+                self._near_builder = threading.Thread(
+                    target=self._add_all_words, args=(items[n:], near), name='near-index', daemon=True)
+                self._near_builder.start()
+                break
+
+    def _add_all_words(self, items, near):
+        for id, entry in items:
+            self._add_words(id, entry, near)
+
+    def near_ids(self, field, word, max_distance, deadline=None):
+        """
+        Return (distance, ids) pairs for lemmas ('l') or glosses ('d')
+        within max_distance edits of word, nearest first. Copies of an
+        index share its word indexes, so ids may include some that this
+        index doesn't have. Building the word indexes counts against the
+        deadline; if a big glossary's can't be built in time, the rest is
+        built in the background, and results are partial until it's done.
+        """
+        if self._near is None or self._near['l'].max_distance < max_distance:
+            self._build_near(max(max_distance, 2), deadline)
+        return [(d, ids) for d, _, ids in self._near[field].search(word.lower(), max_distance, deadline)]
@@ -1,6 +1,19 @@
 import bisect
+import contextlib
+import copy
+import heapq
 import os
 import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from .gindex import GlossaryIndex, bit_ids
+from .lru import LRUCache
+from . import snapshot as snap
 
 NARROWER_EQUIV = '>'
 BROADER_EQUIV = '<'
@@ -14,31 +27,39 @@ COLUMN_COUNT = len(COLUMNS)
 COLUMN_SEP = ' | '
 HEADER = COLUMN_SEP.join(COLUMNS)
 DIVIDER = re.sub('[a-zA-Z]', '-', HEADER)
+JOURNAL_SUFFIX = '.journal'
+JOURNAL_MAGIC = 'lk-journal'
+# Once a journal holds this many changes, the next save rewrites the file.
+JOURNAL_COMPACT_AT = 1000
+SAVE_BUFFER_SIZE = 1 << 16
 DIVIDER_PAT = re.compile(r'\s*' + r"\s*\|\s*".join(['-+']*len(COLUMNS)) + r'\s*')
 
+# Every DefnItem shares one of these strings as its kind.
+_KINDS = {c: sys.intern(c) for c in EQUIV_CHARS}
+
 class DefnItem:
+    __slots__ = ('kind', 'value', 'gloss', 'explanation')
+
     def __init__(self, txt):
         ec = txt[0]
         if ec in EQUIV_CHARS:
-            self.kind = ec
+            self.kind = _KINDS[ec]
             self.value = txt[1:].lstrip()
         else:
             self.kind = EXACT_EQUIV
             self.value = txt.lstrip()
-
-    @property
-    def gloss(self):
-        i = self.value.find('(')
-        return self.value if i == -1 else self.value[:i].rstrip()
-    
-    @property
-    def explanation(self):
-        i = self.value.find('(')
-        if i > -1:
-            j = self.value.find(')', i + 1)
-            if j == -1: j = len(self.value)
-            return self.value[i+1:j]
-        return ''
+        # Split out the gloss and any parenthesized explanation once,
+        # rather than every time someone asks.
+        value = self.value
+        i = value.find('(')
+        if i == -1:
+            self.gloss = value
+            self.explanation = ''
+        else:
+            self.gloss = value[:i].rstrip()
+            j = value.find(')', i + 1)
+            if j == -1: j = len(value)
+            self.explanation = value[i+1:j]
     
     def __str__(self):
         return self.kind + self.value
@@ -56,6 +77,8 @@ class DefnItem:
             return True if i < j else (False if j < i else self.value < other.value)
 
 class Defn:
+    __slots__ = ('equivs', '_txt')
+
     def __init__(self, txt):
         self.equivs = []
         self.parse(txt)
@@ -79,24 +102,142 @@ class Defn:
         return self._txt
     
 class Entry:
-    def __init__(self, fields):
+    __slots__ = ('lemma', '_row', '_tags', '_defn', '_notes')
+
+    def __init__(self, fields, lazy=False):
         if isinstance(fields, str):
+            if lazy:
+                # Keep the raw row and only split out the lemma, which we
+                # need for sorting. Everything else is parsed on first use.
+                i = fields.find('|')
+                if i == -1 or fields.find('|', i + 1) == -1:
+                    raise ValueError("Not a glossary row.")
+                self.lemma = fields[:i].strip()
+                self._row = fields
+                return
             fields = [f.strip() for f in fields.split('|')]
+        self._row = None
+        self._assign(fields)
+
+    def _assign(self, fields):
         self.lemma = fields[0]
-        self.tags = fields[1].split() if isinstance(fields[1], str) else fields[1] 
-        self.defn = Defn(fields[2])
+        tags = fields[1].split() if isinstance(fields[1], str) else fields[1]
+        # The same few tags recur on almost every entry; share the strings.
+        self._tags = [sys.intern(tag) for tag in tags]
+        self._defn = Defn(fields[2])
         if len(fields) > 3 and fields[3]:
-            self.notes = fields[3]
+            self._notes = fields[3]
         else:
-            self.notes = ''
+            self._notes = ''
+
+    @staticmethod
+    def _from_row(lemma, row):
+        # Build a lazy entry whose row may still be undecoded bytes,
+        # such as a slice of a memory-mapped snapshot.
+        entry = Entry.__new__(Entry)
+        entry.lemma = lemma
+        entry._row = row
+        return entry
+
+    def _parse(self):
+        row = self._row
+        if not isinstance(row, str):
+            row = str(row, 'utf-8')
+        fields = [f.strip() for f in row.split('|')]
+        # Fill in the fields before marking the entry parsed, in case
+        # another thread is reading it too.
+        self._assign(fields)
+        self._row = None
+
+    @property
+    def parsed(self) -> bool:
+        return self._row is None
+
+    @property
+    def tags(self):
+        if self._row is not None: self._parse()
+        return self._tags
+
+    @tags.setter
+    def tags(self, value):
+        if self._row is not None: self._parse()
+        self._tags = value
+
+    @property
+    def defn(self):
+        if self._row is not None: self._parse()
+        return self._defn
+
+    @defn.setter
+    def defn(self, value):
+        if self._row is not None: self._parse()
+        self._defn = value
+
+    @property
+    def notes(self):
+        if self._row is not None: self._parse()
+        return self._notes
+
+    @notes.setter
+    def notes(self, value):
+        if self._row is not None: self._parse()
+        self._notes = value
 
     def __lt__(self, other):
         return self.lemma < other.lemma
 
     def __str__(self):
+        row = self._row
+        if row is not None:
+            # Untouched, so it's saved just as it was read.
+            return row if isinstance(row, str) else str(row, 'utf-8')
         suffix = '' if self.notes is None else COLUMN_SEP + self.notes 
         return self.lemma + COLUMN_SEP + ' '.join(sorted(self.tags)) + COLUMN_SEP + str(self.defn) + suffix
     
+def _change(entry, lemma=None, tags=None, defn=None, notes=None):
+    if lemma is not None:
+        entry.lemma = lemma
+    if tags is not None:
+        entry.tags = tags.split() if isinstance(tags, str) else tags
+    if defn is not None:
+        entry.defn = defn if isinstance(defn, Defn) else Defn(defn)
+    if notes is not None:
+        entry.notes = notes
+    return entry
+
+def _remove(entries, entry):
+    """
+    Take entry out of a sorted entry list. Quicker than entries.remove(),
+    which compares entry with everything ahead of it.
+    """
+    i = bisect.bisect_left(entries, entry.lemma, key=lambda x: x.lemma)
+    while i < len(entries) and entries[i].lemma == entry.lemma:
+        if entries[i] is entry:
+            del entries[i]
+            return
+        i += 1
+    entries.remove(entry)
+
+def _in_list_order(hits, entries):
+    """
+    Put hits that share a lemma in the order they have in entries, the
+    sorted entry list they came from. hits must already be sorted by
+    lemma.
+    """
+    i = 0
+    while i < len(hits):
+        lemma = hits[i].lemma
+        j = i + 1
+        while j < len(hits) and hits[j].lemma == lemma:
+            j += 1
+        if j - i > 1:
+            same = set(hits[i:j])
+            start = bisect.bisect_left(entries, lemma, key=lambda x: x.lemma)
+            end = bisect.bisect_right(entries, lemma, key=lambda x: x.lemma)
+            hits[i:j] = [e for e in entries[start:end] if e in same]
+        i = j
+    return hits
+
 def _is_header(entry: Entry) -> bool:
     return entry.lemma == COLUMNS[0]
 
@@ -130,10 +271,16 @@ class MatchExpr:
     def __str__(self):
         return self.expr
 
+    def __eq__(self, other):
+        return isinstance(other, MatchExpr) and self.expr == other.expr
+
+    def __hash__(self):
+        return hash(self.expr)
+
     def matches(self, txt) -> bool:
         return self._regex.match(txt) if self._regex else (self.expr == txt)
 
-SCOPED_SEARCH_EXPR = re.compile(r'(?:^|\s)(l(?:e(?:m(?:m(?:a)?)?)?)?|t(?:a(?:g(?:s)?)?)?|d(?:e(?:f(?:n)?)?)?|n(?:o(?:t(?:e(?:s)?)?)?)?):')
+SCOPED_SEARCH_EXPR = re.compile(r'(?:^|\s)(l(?:e(?:m(?:m(?:a)?)?)?)?|t(?:a(?:g(?:s)?)?)?|p(?:o(?:s)?)?|d(?:e(?:f(?:n)?)?)?|n(?:o(?:t(?:e(?:s)?)?)?)?):')
 class SearchExpr:
     def __init__(self, expr):
         criteria = []
@@ -156,7 +303,10 @@ class SearchExpr:
         while i < len(chunks):
             m = chunks[i + 1].strip()
             if m:
-                criteria.append((chunks[i][0], MatchExpr(m)))
+                field = chunks[i][0]
+                # Part of speech is always one of the tags.
+                if field == 'p': field = 't'
+                criteria.append((field, MatchExpr(m)))
             i += 2
         self.criteria = criteria
 
@@ -188,84 +338,337 @@ class SearchExpr:
         return ''
         
     def matches(self, entry: Entry) -> bool:
-        for field_selector, match_expr in self.criteria:
-            possibilities = 2 if field_selector == 'x' else 1
-            # First look in the simple fields.
-            text = None
-            if field_selector in 'lx': text = entry.lemma
-            elif field_selector == 'n': text = entry.notes
-            if text and not match_expr.matches(text):
+        return _criteria_match(self.criteria, entry)
+
+def _criteria_match(criteria, entry: Entry) -> bool:
+    for field_selector, match_expr in criteria:
+        possibilities = 2 if field_selector == 'x' else 1
+        # First look in the simple fields.
+        text = None
+        if field_selector in 'lx': text = entry.lemma
+        elif field_selector == 'n': text = entry.notes
+        if text and not match_expr.matches(text):
+            possibilities -= 1
+        # Now look in tags, which might be multiple.
+        if field_selector == 't':
+            found = False
+            for tag in entry.tags:
+                if match_expr.matches(tag):
+                    found = True
+                    break
+            if not found:
                 possibilities -= 1
-            # Now look in tags, which might be multiple.
-            if field_selector == 't':
-                found = False
-                for tag in entry.tags:
-                    if match_expr.matches(tag):
-                        found = True
-                        break
-                if not found:
-                    possibilities -= 1
-            # Now look in the definition, which has subfields.
-            if possibilities and (field_selector in 'dx'):
-                found = False
-                for defn_item in entry.defn.equivs:
-                    if match_expr.matches(defn_item.value):
-                        found = True
-                        break
-                if not found:
-                    possibilities -= 1
-            if possibilities < 1: return False
-        return True
+        # Now look in the definition, which has subfields.
+        if possibilities and (field_selector in 'dx'):
+            found = False
+            for defn_item in entry.defn.equivs:
+                if match_expr.matches(defn_item.value):
+                    found = True
+                    break
+            if not found:
+                possibilities -= 1
+        if possibilities < 1: return False
+    return True
+
+class QueryPlan(namedtuple('QueryPlan', ['criteria', 'starter', 'fuzzy'])):
+    """
+    The compiled, immutable form of a search expression: a tuple of
+    (field selector, MatchExpr) criteria, the lemma starter used to
+    bisect, and the plan for the fuzzy fallback (None if fuzzifying
+    wouldn't change anything).
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def from_search_expr(s_expr: SearchExpr):
+        fuzzy = copy.copy(s_expr)
+        fuzzy.criteria = list(s_expr.criteria)
+        fuzzy = QueryPlan.from_search_expr(fuzzy) if fuzzy.fuzzify() else None
+        return QueryPlan(tuple(s_expr.criteria), s_expr.starter, fuzzy)
+
+    def matches(self, entry: Entry) -> bool:
+        return _criteria_match(self.criteria, entry)
+
+    def __str__(self):
+        return ' '.join([f"{f}:{m}" for f, m in self.criteria])
+
+# Plans for recently used expression text. Glossary lookups tend to reuse
+# a small number of expressions over and over, so this stays hot.
+PLAN_CACHE = LRUCache(512)
+
+def compile_query(expr) -> QueryPlan:
+    if isinstance(expr, QueryPlan):
+        return expr
+    if isinstance(expr, SearchExpr):
+        return QueryPlan.from_search_expr(expr)
+    plan = PLAN_CACHE.get(expr)
+    if plan is None:
+        plan = QueryPlan.from_search_expr(SearchExpr(expr))
+        PLAN_CACHE.put(expr, plan)
+    return plan
+
+def _narrowest(*id_sets):
+    found = None
+    for ids in id_sets:
+        if ids is not None:
+            found = ids if found is None else found & ids
+    return found
+
+class _Batch:
+    def __init__(self):
+        self.adds = []
+        self.removes = []
+
+class _State:
+    """
+    One consistent version of a glossary's contents. Once published, it
+    isn't changed, so readers can use it without locking; the only
+    exception is that its index and stats are filled in on first use.
+    """
+    __slots__ = ('entries', 'index', 'stats', 'generation')
+
+    def __init__(self, entries, index, stats, generation):
+        self.entries = entries
+        self.index = index
+        self.stats = stats
+        self.generation = generation
+
+class _Draft:
+    """
+    Private copies of a glossary's state, for a writer to change before
+    publishing them.
+    """
+    def __init__(self, state):
+        self.entries = list(state.entries)
+        index = state.index
+        self.index = index.copy() if index is not None and index.count == len(state.entries) else None
+        stats = state.stats
+        if stats is not None:
+            stats = dict(stats, tags=dict(stats["tags"]), meanings=dict(stats["meanings"]))
+        self.stats = stats
+
+    def tally(self, entry, sign=1):
+        # Stats that haven't been computed yet are left for the full pass.
+        if self.stats is not None:
+            tally(self.stats, entry, sign)
+            self.stats["unique entries"] = len(self.entries)
+
+def new_stats():
+    return {"unique meanings": 0, "tags": {}, "meanings": {}, "unique tags": 0, "unique entries": 0}
+
+def tally(stats, entry, sign=1):
+    """Add an entry's counts to stats, or take them away if sign is -1."""
+    def increment(accumulator, key, how_much):
+        n = accumulator.get(key, 0) + how_much
+        if n:
+            accumulator[key] = n
+        else:
+            del accumulator[key]
+    equivs = entry.defn.equivs
+    stats["unique meanings"] += sign * len(equivs)
+    for tag in entry.tags:
+        increment(stats["tags"], tag, sign)
+    for equiv in equivs:
+        kind = equiv.kind if equiv.kind else "simple equiv"
+        increment(stats["meanings"], kind, sign)
+    stats["unique tags"] = len(stats["tags"])
+
+# How well a hit matches, for ranked searches; lower is better.
+RANK_EXACT = 0
+RANK_EXACT_OTHER_KIND = 1
+RANK_PREFIX = 2
+RANK_OTHER = 3
+
+def _rank_term(plan):
+    """
+    The text that ranked searches compare equivalents with: the first
+    definition or unscoped criterion, lowercased and without wildcards.
+    """
+    for field, match_expr in plan.criteria:
+        if field in 'dx':
+            term = ' '.join(re.split('[*?!]+', match_expr.expr)).strip().lower()
+            if term:
+                return term
+    return None
+
+def _rank(entry, term):
+    rank = RANK_OTHER
+    for item in entry.defn.equivs:
+        if item.gloss.lower() == term:
+            # An exact equivalent beats a rough or explained one.
+            if item.kind == EXACT_EQUIV:
+                return RANK_EXACT
+            rank = RANK_EXACT_OTHER_KIND
+        elif rank > RANK_PREFIX and item.value.lower().startswith(term):
+            rank = RANK_PREFIX
+    return rank
+
+# An expression that starts with this asks for approximate matches.
+APPROX_PREFIX = '~'
+APPROX_MAX_DISTANCE = 2
+# Seconds an approximate search may spend before settling for what it has.
+APPROX_BUDGET = 0.25
+
+# A batch that touches more than 1/BATCH_REINDEX_RATIO of the entries
+# throws the index away to be rebuilt, rather than updating it in place.
+BATCH_REINDEX_RATIO = 10
 
 class Glossary:
     def __init__(self):
         self.pre = ''
         self.fname = None
-        self.entries = []
+        self.lazy = False
+        self.snapshot = False
+        # When true, save() appends changed rows to a journal instead of
+        # rewriting the whole file.
+        self.journal = False
+        self._pending = []
+        self._journal_len = 0
+        # The mtime and size of the file as we last read or wrote it.
+        self._stamp = None
+        # Called after each full write of the file, e.g. by watchers.
+        self._on_write = []
+        self._batch = None
         self._unsaved = False
         self.post = ''
-        self._stats = None
+        # Readers take whatever state is current and never lock. Writers
+        # take the lock, change a _Draft, and publish it as the new state.
+        self._lock = threading.RLock()
+        self._state = _State([], None, None, 0)
+        self._results = LRUCache(1024)
+
+    @property
+    def entries(self):
+        return self._state.entries
+
+    @entries.setter
+    def entries(self, entries):
+        with self._lock:
+            self._publish(entries)
+
+    @property
+    def generation(self):
+        # Bumped by every change, so derived data can tell it's stale.
+        return self._state.generation
+
+    def _publish(self, entries, index=None, stats=None):
+        # A single assignment, so readers see all of a change or none of it.
+        self._state = _State(entries, index, stats, self._state.generation + 1)
+        self._results.clear()
+
+    @contextlib.contextmanager
+    def _writing(self, unsaved=True):
+        """
+        Let a writer change copies of the current state, and publish
+        them when the with block ends. If the block raises, nothing
+        changes.
+        """
+        with self._lock:
+            draft = _Draft(self._state)
+            yield draft
+            self._publish(draft.entries, draft.index, draft.stats)
+            if unsaved:
+                self._unsaved = True
+
+    def _index_of(self, state) -> GlossaryIndex:
+        # Built on first use rather than at load time, so that opening a
+        # glossary just to add or show a word doesn't pay for it. If
+        # someone changed self.entries behind our back, start over. Only
+        # one thread builds it, so everyone sees the same ids.
+        if state.index is None or state.index.count != len(state.entries):
+            with self._lock:
+                if state.index is None or state.index.count != len(state.entries):
+                    state.index = GlossaryIndex(state.entries)
+        return state.index
+
+    @property
+    def index(self) -> GlossaryIndex:
+        return self._index_of(self._state)
+
+    def _tally_all(self, entries):
+        stats = new_stats()
+        for entry in entries:
+            tally(stats, entry)
+        stats["unique entries"] = len(entries)
+        return stats
 
     @property
     def stats(self):
-        if self._stats is None:
-            def increment(accumulator, key, how_much=1):
-                if not key in accumulator:
-                    accumulator[key] = 0
-                accumulator[key] += how_much
-            def tally_defs():
-                equivs = {}
-                root = {}
-                tags = {}
-                for entry in self.entries:
-                    increment(root, "unique meanings", len(entry.defn.equivs))
-                    for tag in entry.tags:
-                        increment(tags, tag)
-                    for equiv in entry.defn.equivs:
-                        kind = equiv.kind if equiv.kind else "simple equiv"
-                        increment(equivs, kind)
-                root["tags"] = tags
-                root["meanings"] = equivs
-                root["unique tags"] = len(tags.keys())
-                return root
-            self._stats = tally_defs()
-            self._stats["unique entries"] = len(self.entries)
-        return self._stats
-    
+        # After the first full pass, insert, edit and delete keep these
+        # counts current as they go.
+        state = self._state
+        if state.stats is None:
+            with self._lock:
+                if state.stats is None:
+                    state.stats = self._tally_all(state.entries)
+        return state.stats
+
     @property
     def lemma_count(self):
         return len(self.entries)
 
     @staticmethod
-    def load(fname):
+    def load(fname, lazy=False, snapshot=False):
+        """
+        Load a glossary file. With lazy=True, entries keep their raw text
+        and only parse tags, definition and notes when first used. That
+        makes opening a big glossary much faster, at the cost of finding
+        malformed rows later rather than now.
+
+        With snapshot=True, a compiled sidecar next to the file is
+        memory-mapped instead, if it was built from this exact version
+        of the file; otherwise the file is parsed and the sidecar is
+        rebuilt. Entries loaded from a snapshot are always lazy.
+        """
         g = Glossary()
         g.fname = os.path.normpath(os.path.abspath(fname))
+        g.lazy = lazy
+        g.snapshot = snapshot
+        source_stamp = g._stamp = snap.stamp(g.fname)
+        if snapshot:
+            mapped = snap.read(g.fname + snap.SUFFIX, source_stamp)
+            if mapped:
+                meta, rows = mapped
+                g.pre = meta['pre']
+                g.post = meta['post']
+                g._publish([Entry._from_row(lemma, row) for lemma, row in rows], stats=meta.get('stats'))
+                g._replay_journal()
+                return g
         with open(g.fname, 'rt') as f:
-            lines = f.readlines()
+            g._read(f, lazy)
+        if snapshot:
+            g.write_snapshot(source_stamp)
+        g._replay_journal()
+        return g
+
+    def write_snapshot(self, source_stamp=None):
+        """
+        Compile this glossary into the sidecar that load(snapshot=True)
+        maps. Failing to write it (a read-only folder, say) isn't fatal.
+        """
+        if source_stamp is None:
+            source_stamp = snap.stamp(self.fname)
+        try:
+            snap.write(self.fname + snap.SUFFIX, source_stamp, self.pre, self.post,
+                       [(e.lemma, str(e)) for e in self.entries], self.stats)
+            return True
+        except OSError:
+            return False
+
+    def _read(self, lines, lazy=False):
+        """
+        Parse glossary text from any iterable of lines, in a single pass.
+        """
         pre = True
         found_header = False
         found_divider = False
         found_nonblank_post = False
+        # Files written by save() are already sorted, so we only sort
+        # if we notice something out of order.
+        in_order = True
+        last_lemma = None
+        pre_lines = []
+        post_lines = []
         n = 0
         for line in lines:
             stripped = line.strip()
@@ -274,11 +677,12 @@ class Glossary:
             if entry:
                 e = None
                 try:
-                    e = Entry(stripped)
+                    # Lazy entries keep the line as it was, spacing and all.
+                    e = Entry(line.rstrip('\n') if lazy else stripped, lazy)
                     pre = False
                 except Exception as ex:
                     entry = False
-                    if g.lemma_count:
+                    if self.entries:
                         pre = False
                 if e:
                     if _is_header(e):
@@ -292,75 +696,564 @@ class Glossary:
                     else:
                         if found_nonblank_post:
                             raise Exception(f"Didn't expect a new entry on line {n}.")
-                        g.entries.append(e)
-                        g.post = ''
+                        if in_order and last_lemma is not None and e.lemma < last_lemma:
+                            in_order = False
+                        last_lemma = e.lemma
+                        self.entries.append(e)
+                        post_lines = []
             if not entry:
                 if pre:
-                    g.pre += line
+                    pre_lines.append(line)
                 else:
-                    if line.strip():
+                    if stripped:
                         found_nonblank_post = True
-                    g.post += line
-        g.entries.sort()
-        return g
-    
+                    post_lines.append(line)
+        self.pre += ''.join(pre_lines)
+        self.post = ''.join(post_lines)
+        if not in_order:
+            self.entries.sort()
+
+    def reload(self):
+        """
+        Re-read this glossary from disk, discarding unsaved changes.
+        """
+        fresh = Glossary.load(self.fname, self.lazy, self.snapshot)
+        with self._lock:
+            self.pre = fresh.pre
+            self.post = fresh.post
+            self._publish(fresh.entries, stats=fresh._state.stats)
+            self._journal_len = fresh._journal_len
+            self._stamp = fresh._stamp
+            self._pending = []
+            self._unsaved = False
+
+    @property
+    def journal_fname(self):
+        return self.fname + JOURNAL_SUFFIX
+
+    def _journal_changes(self, any_version=False):
+        """
+        The journal's changes as (line number, op, row), or None if there
+        is no journal, or it doesn't belong to the current version of the
+        file and any_version is false. A last line cut off by a crash
+        partway through a save is left out; that change never finished.
+        """
+        try:
+            f = open(self.journal_fname, 'rt')
+        except FileNotFoundError:
+            return None
+        with f:
+            if not self._journal_matches(f.readline()) and not any_version:
+                return None
+            changes = []
+            for n, line in enumerate(f, 2):
+                if not line.endswith('\n'):
+                    break
+                changes.append((n, line[:1], line[2:].rstrip('\n')))
+        return changes
+
+    def _replay_journal(self, changes=None):
+        """
+        Apply changes that were appended to a journal since the glossary
+        file was last written in full. A journal that doesn't belong to
+        the current version of the file is left alone. Changes read from
+        the journal of an older version can be passed in instead; then
+        deletes of rows that are no longer here are skipped.
+        """
+        strict = changes is None
+        if strict:
+            changes = self._journal_changes()
+        if not changes:
+            return
+        with self._writing(unsaved=False) as draft:
+            for n, op, row in changes:
+                if op == '+':
+                    try:
+                        entry = Entry(row)
+                    except (IndexError, ValueError):
+                        raise Exception(f"Journal line {n} isn't a valid glossary row: {row}")
+                    index = bisect.bisect_left(draft.entries, entry.lemma, key=lambda x: x.lemma)
+                    draft.entries.insert(index, entry)
+                    draft.tally(entry)
+                elif op == '-':
+                    entry = self._row_entry(row, entries=draft.entries)
+                    if entry is None:
+                        if strict:
+                            raise Exception(f"Journal line {n} deletes an entry that isn't there.")
+                        continue
+                    _remove(draft.entries, entry)
+                    draft.tally(entry, -1)
+                self._journal_len += 1
+
+    def _journal_matches(self, header):
+        # Whether a journal header was written for the file as it is now.
+        header = header.split()
+        try:
+            return header[:1] == [JOURNAL_MAGIC] and tuple(int(x) for x in header[1:3]) == snap.stamp(self.fname)
+        except ValueError:
+            return False
+
+    def _can_append_journal(self):
+        """
+        Whether new changes can go at the end of the journal: there isn't
+        one yet, or it belongs to the file as it is now and its last line
+        is whole. Changes appended to any other journal would never be
+        replayed.
+        """
+        try:
+            f = open(self.journal_fname, 'rb')
+        except FileNotFoundError:
+            return True
+        with f:
+            if not self._journal_matches(f.readline().decode('utf-8', 'replace')):
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _row_entry(self, row, skip=(), entries=None):
+        """
+        Find the entry that a row of glossary text stands for, ignoring
+        any in skip, or return None.
+        """
+        entries = self.entries if entries is None else entries
+        row = Entry(row)
+        lemma, row = row.lemma, str(row)
+        index = bisect.bisect_left(entries, lemma, key=lambda x: x.lemma)
+        while index < len(entries) and entries[index].lemma == lemma:
+            entry = entries[index]
+            # Unparsed entries keep their text as written, so compare
+            # the way it would be written after parsing.
+            text = str(entry) if entry.parsed else str(Entry(str(entry)))
+            if text == row and entry not in skip:
+                return entry
+            index += 1
+        return None
+
+    def patch(self, removed, added):
+        """
+        Catch up with rows that were taken out of and added to the file
+        by someone else, updating indexes and stats in a single pass. The
+        file already has these changes, so they don't count as unsaved.
+        Returns False, changing nothing, if a removed row isn't here.
+        """
+        with self._lock:
+            gone = []
+            for row in removed:
+                entry = self._row_entry(row, gone)
+                if entry is None:
+                    return False
+                gone.append(entry)
+            unsaved, pending = self._unsaved, list(self._pending)
+            self._merge([Entry(row, self.lazy) for row in added], gone)
+            self._unsaved, self._pending = unsaved, pending
+        return True
+
+    def _write(self, f):
+        if self.pre.strip():
+            f.write(self.pre)
+        f.write(HEADER + '\n' + DIVIDER + '\n')
+        f.writelines([str(entry) + '\n' for entry in self.entries])
+        if self.post.strip():
+            f.write(self.post)
+
+    def _write_atomically(self, fname):
+        # Write next to the real file, then swap it in, so a crash can't
+        # leave a half-written glossary behind.
+        folder, name = os.path.split(fname)
+        fd, tmp = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=folder)
+        try:
+            with os.fdopen(fd, 'wt', buffering=SAVE_BUFFER_SIZE) as f:
+                self._write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(fname):
+                shutil.copymode(fname, tmp)
+            os.replace(tmp, fname)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def _append_journal(self):
+        exists = os.path.exists(self.journal_fname)
+        with open(self.journal_fname, 'at') as f:
+            if not exists:
+                mtime_ns, size = snap.stamp(self.fname)
+                f.write(f"{JOURNAL_MAGIC} {mtime_ns} {size}\n")
+            f.writelines([f"{op} {row}\n" for op, row in self._pending])
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_len += len(self._pending)
+
+    def compact(self):
+        """
+        Fold any journaled changes into the glossary file itself.
+        """
+        self._write_atomically(self.fname)
+        self._stamp = snap.stamp(self.fname)
+        for callback in self._on_write:
+            callback()
+        if os.path.exists(self.journal_fname):
+            os.unlink(self.journal_fname)
+        self._journal_len = 0
+        self._pending = []
+
     def save(self, fname=None, handle=None, force: bool=False):
-        force = force or bool(handle)
-        if fname is None:
-            fname = self.fname
-        else:
-            fname = os.path.normpath(os.path.abspath(fname))
-            if self.fname is None:
-                self.fname = fname
+        with self._lock:
+            force = force or bool(handle)
+            if fname is None:
+                fname = self.fname
             else:
-                force = fname != self.fname
-        if force or self._unsaved:
-            f = handle
-            if not f:
-                f = open(fname, 'wt')
-            try:
-                if self.pre.strip():
-                    f.write(self.pre)
-                f.write(HEADER + '\n' + DIVIDER + '\n')
-                for entry in self.entries:
-                    f.write(str(entry) + '\n')
-                if self.post.strip():
-                    f.write(self.post)
+                fname = os.path.normpath(os.path.abspath(fname))
+                if self.fname is None:
+                    self.fname = fname
+                else:
+                    force = fname != self.fname
+            if force or self._unsaved:
+                if handle:
+                    self._write(handle)
+                elif fname != self.fname:
+                    self._write_atomically(fname)
+                elif self.journal and os.path.exists(fname) and \
+                        self._journal_len + len(self._pending) < JOURNAL_COMPACT_AT and \
+                        self._can_append_journal():
+                    # Record just what changed; compaction catches up later.
+                    self._append_journal()
+                    self._pending = []
+                else:
+                    self.compact()
                 if not force:
                     self._unsaved = False
-            finally:
-                if not handle:
-                    f.close()
-            return True
+                return True
 
-    def find(self, expr, max_hits=5, exclude=None, try_fuzzy=False):
-        hits = []
-        s_expr = expr if isinstance(expr, SearchExpr) else SearchExpr(expr)
-        initial_search = s_expr.starter
-        index = bisect.bisect_left(self.entries, initial_search, key=lambda x: x.lemma) \
-            if initial_search else 0
-        while index < self.lemma_count and max_hits != 0:
-            entry = self.entries[index]
-            if s_expr.matches(entry):
+    def _lemma_ids(self, match_expr, state):
+        # Ids of entries whose lemma might match, using the sort order.
+        starter = match_expr.starter
+        if not starter:
+            return None
+        ids = state.index.ids
+        entries = state.entries
+        found = set()
+        i = bisect.bisect_left(entries, starter, key=lambda x: x.lemma)
+        while i < len(entries):
+            entry = entries[i]
+            if entry.lemma != starter and (not match_expr.wildcarded or not entry.lemma.startswith(starter)):
+                break
+            found.add(ids[entry])
+            i += 1
+        return found
+
+    def _candidates(self, plan: QueryPlan, state):
+        """
+        Return a set of ids that includes every entry that could match,
+        or None if the indexes can't rule anything out.
+        """
+        found = None
+        tag_bits = None
+        for field, match_expr in plan.criteria:
+            if field == 'l' and match_expr.starter:
+                # A lemma with a starter is cheaper to bisect for.
+                continue
+            index = self._index_of(state)
+            if field == 't':
+                bits = index.tag_bits(match_expr)
+                tag_bits = bits if tag_bits is None else tag_bits & bits
+                if not tag_bits:
+                    return set()
+                continue
+            ids = None
+            if field in 'dx':
+                ids = _narrowest(index.defn_ids(match_expr), index.gram_ids('d', match_expr))
+                if ids is not None and field == 'x':
+                    lemma_ids = self._lemma_ids(match_expr, state)
+                    if lemma_ids is None:
+                        lemma_ids = index.gram_ids('l', match_expr)
+                    ids = None if lemma_ids is None else ids | lemma_ids
+            elif field == 'l':
+                ids = index.gram_ids('l', match_expr)
+            elif field == 'n':
+                ids = index.gram_ids('n', match_expr)
+            if ids is not None:
+                found = ids if found is None else found & ids
+                if not found:
+                    return found
+        if tag_bits is not None:
+            if found is None:
+                found = bit_ids(tag_bits)
+            else:
+                found = {id for id in found if (tag_bits >> id) & 1}
+        return found
+
+    def _scan(self, plan: QueryPlan, exclude=None, state=None):
+        """
+        Yield entries that match, in sort order.
+        """
+        state = state or self._state
+        candidates = self._candidates(plan, state)
+        if candidates is None:
+            initial_search = plan.starter
+            index = bisect.bisect_left(state.entries, initial_search, key=lambda x: x.lemma) \
+                if initial_search else 0
+            entries = state.entries[index:]
+        elif len(candidates) * 4 > len(state.entries):
+            # Most entries are candidates; walking the list is cheaper than sorting.
+            initial_search = ''
+            ids = state.index.ids
+            entries = [e for e in state.entries if ids[e] in candidates]
+        else:
+            initial_search = ''
+            by_id = state.index.by_id
+            entries = sorted([by_id[id] for id in candidates], key=lambda x: x.lemma)
+            # Homonyms come in list order, as they would from a walk.
+            entries = _in_list_order(entries, state.entries)
+        for entry in entries:
+            if plan.matches(entry):
                 if not exclude or (entry not in exclude):
+                    yield entry
+            elif initial_search and not entry.lemma.startswith(initial_search):
+                break
+
+    def find(self, expr, max_hits=5, exclude=None, try_fuzzy=False, ranked=False):
+        """
+        Return up to max_hits entries that match expr, in lemma order. With
+        ranked=True, hits are ordered by how well a definition matches
+        instead: see _rank().
+        """
+        if isinstance(expr, str) and expr.startswith(APPROX_PREFIX):
+            return self.find_approx(expr, max_hits)
+        plan = compile_query(expr)
+        # Search one state throughout, even if a writer publishes another.
+        state = self._state
+        if exclude:
+            return self._find(plan, max_hits, exclude, try_fuzzy, ranked, state)
+        # Batch lookups repeat the same queries a lot; remember answers
+        # until the glossary changes.
+        key = (plan, max_hits, try_fuzzy, ranked, state.generation)
+        hits = self._results.get(key)
+        if hits is None:
+            hits = self._find(plan, max_hits, None, try_fuzzy, ranked, state)
+            self._results.put(key, tuple(hits))
+            return hits
+        return list(hits)
+
+    def _find(self, plan, max_hits, exclude, try_fuzzy, ranked=False, state=None):
+        state = state or self._state
+        hits = []
+        if max_hits:
+            if ranked and _rank_term(plan):
+                hits = self._find_ranked(plan, max_hits, exclude, state)
+                max_hits -= len(hits)
+            else:
+                for entry in self._scan(plan, exclude, state):
                     hits.append(entry)
                     max_hits -= 1
-            elif initial_search and entry.lemma > s_expr.starter:
-                break
-            index += 1
+                    if not max_hits:
+                        break
         # Now that we've found hits that start with expr, look
         # for ones that just contain it. The purpose of always
         # doing a fuzzy search is not simply to make finding easier,
         # but to make sure that as glossary edits occur, an awareness
         # of similar words is encouraged.
-        if try_fuzzy and max_hits:
-            if s_expr.fuzzify():
-                hits += self.find(s_expr, max_hits, hits)
+        if try_fuzzy and max_hits and plan.fuzzy:
+            hits += self._find(plan.fuzzy, max_hits, hits, False, ranked, state)
 
         return hits
-    
+
+    def _find_ranked(self, plan, max_hits, exclude, state):
+        """
+        Keep the best hits so far in a bounded, sorted buffer. Candidates
+        come from the indexes a rank at a time, so once the buffer is full
+        of hits that no later candidate can beat, we stop looking.
+        """
+        term = _rank_term(plan)
+        limit = max_hits if max_hits > 0 else None
+        index = self._index_of(state)
+        by_id = index.by_id
+        ids = index.ids
+        best = []
+        seen = set()
+
+        def consider(entries):
+            for entry in entries:
+                if entry in seen:
+                    continue
+                seen.add(entry)
+                if (exclude and entry in exclude) or not plan.matches(entry):
+                    continue
+                bisect.insort(best, (_rank(entry, term), entry.lemma, ids[entry], entry))
+                if limit and len(best) > limit:
+                    best.pop()
+
+        def settled(rank):
+            # Nothing still to come ranks better than rank.
+            return limit and len(best) == limit and best[-1][0] < rank
+
+        consider(by_id[id] for id in sorted(index.glosses.get(term, ())))
+        if not settled(RANK_PREFIX):
+            prefixed = index.defn_ids(MatchExpr(term + '*'))
+            if prefixed is not None:
+                consider(by_id[id] for id in sorted(prefixed))
+            if not settled(RANK_OTHER):
+                consider(self._scan(plan, exclude, state))
+        return [item[-1] for item in best]
+
+    def find_approx(self, expr, max_hits=5, max_distance=APPROX_MAX_DISTANCE, budget=APPROX_BUDGET):
+        """
+        Find entries whose lemma or glosses are within max_distance edits
+        of a possibly misspelled word, nearest first. The expression looks
+        like '~d:recieve' or '~l:frie t:v'; the first criterion is the one
+        matched approximately, and any others must match as usual. The
+        search gives up and returns what it has after budget seconds.
+        """
+        return [entry for _, entry in self._find_near(expr, max_hits, max_distance, budget)]
+
+    def _find_near(self, expr, max_hits, max_distance, budget):
+        # find_approx(), as (distance, entry) pairs.
+        if expr.startswith(APPROX_PREFIX):
+            expr = expr[len(APPROX_PREFIX):]
+        criteria = SearchExpr(expr).criteria
+        if not criteria:
+            return []
+        field, match_expr = criteria[0]
+        if field not in 'ldx':
+            raise ValueError("Approximate search only works on lemmas and definitions.")
+        deadline = time.perf_counter() + budget
+        index = self.index
+        by_id = index.by_id
+        nearest = {}
+        for tree in ['l', 'd'] if field == 'x' else [field]:
+            for distance, ids in index.near_ids(tree, match_expr.expr, max_distance, deadline):
+                for id in ids:
+                    if id in by_id and nearest.get(id, distance + 1) > distance:
+                        nearest[id] = distance
+        ranked = sorted(nearest, key=lambda id: (nearest[id], by_id[id].lemma))
+        hits = []
+        for id in ranked:
+            entry = by_id[id]
+            if _criteria_match(criteria[1:], entry):
+                hits.append((nearest[id], entry))
+                if len(hits) == max_hits:
+                    break
+        return hits
+
     def insert(self, entry: Entry):
-        index = bisect.bisect_left(self.entries, entry.lemma, key=lambda x: x.lemma)
-        self.entries.insert(index, entry)
-        self._unsaved = True
-        self._stats = None
+        with self._lock:
+            if self._batch is not None:
+                self._batch.adds.append(entry)
+                return
+            with self._writing() as draft:
+                index = bisect.bisect_left(draft.entries, entry.lemma, key=lambda x: x.lemma)
+                draft.entries.insert(index, entry)
+                if draft.index is not None:
+                    draft.index.add(entry)
+                draft.tally(entry)
+                self._pending.append(('+', str(entry)))
+
+    def delete(self, entry: Entry):
+        with self._lock:
+            if self._batch is not None:
+                self._batch.removes.append(entry)
+                return
+            with self._writing() as draft:
+                _remove(draft.entries, entry)
+                if draft.index is not None:
+                    draft.index.remove(entry)
+                draft.tally(entry, -1)
+                self._pending.append(('-', str(entry)))
+
+    def edit(self, entry: Entry, lemma=None, tags=None, defn=None, notes=None):
+        """
+        Change one or more fields of an entry in this glossary, keeping
+        sort order and indexes current. Fields left as None are unchanged.
+        Edits take effect immediately, even inside a batch.
+
+        Readers may still be using the entry, so it's left alone and an
+        edited copy takes its place. Returns the copy.
+        """
+        with self._lock:
+            if self._batch is not None and entry in self._batch.adds:
+                # Nobody else can see this one yet.
+                _change(entry, lemma, tags, defn, notes)
+                return entry
+            with self._writing() as draft:
+                _remove(draft.entries, entry)
+                if draft.index is not None:
+                    draft.index.remove(entry)
+                draft.tally(entry, -1)
+                self._pending.append(('-', str(entry)))
+                edited = _change(copy.copy(entry), lemma, tags, defn, notes)
+                index = bisect.bisect_left(draft.entries, edited.lemma, key=lambda x: x.lemma)
+                draft.entries.insert(index, edited)
+                if draft.index is not None:
+                    draft.index.add(edited)
+                draft.tally(edited)
+                self._pending.append(('+', str(edited)))
+            return edited
+
+    @contextlib.contextmanager
+    def batch(self, save=False):
+        """
+        Defer inserts and deletes until the end of a with block, then
+        merge them into the entry list in a single pass, update derived
+        data once, and optionally save once. If the block raises, the
+        deferred inserts and deletes are dropped. Lookups inside the
+        block see the glossary as it was before the block. Other threads
+        can't change the glossary until the block ends.
+        """
+        with self._lock:
+            if self._batch is not None:
+                yield self
+                return
+            self._batch = _Batch()
+            try:
+                yield self
+                batch = self._batch
+            finally:
+                self._batch = None
+            self._merge(batch.adds, batch.removes)
+            if save:
+                self.save()
+
+    def insert_many(self, entries, save=False):
+        with self.batch(save):
+            for entry in entries:
+                self.insert(entry)
+
+    def delete_many(self, entries, save=False):
+        with self.batch(save):
+            for entry in entries:
+                self.delete(entry)
+
+    def _merge(self, adds, removes):
+        if not adds and not removes:
+            return
+        # Deleting something added in the same batch cancels both.
+        adds = list(adds)
+        removed = set()
+        for entry in removes:
+            if entry in adds:
+                adds.remove(entry)
+            else:
+                removed.add(entry)
+        with self._writing() as draft:
+            kept = [e for e in draft.entries if e not in removed]
+            if len(kept) + len(removed) != len(draft.entries):
+                raise ValueError("Can't delete an entry that isn't in the glossary.")
+            adds.sort()
+            # New entries go ahead of existing ones with the same lemma, as
+            # they would with insert().
+            draft.entries = list(heapq.merge(adds, kept, key=lambda x: x.lemma))
+            if draft.index is not None:
+                if (len(adds) + len(removed)) * BATCH_REINDEX_RATIO > len(draft.entries):
+                    draft.index = None
+                else:
+                    for entry in removed:
+                        draft.index.remove(entry)
+                    for entry in adds:
+                        draft.index.add(entry)
+            for entry in removed:
+                draft.tally(entry, -1)
+            for entry in adds:
+                draft.tally(entry)
+            self._pending += [('-', str(e)) for e in removes if e in removed]
+            self._pending += [('+', str(e)) for e in adds]
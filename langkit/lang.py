@@ -2,6 +2,8 @@ import os
 import json
 
 from .glossary import Glossary
+from .layered import LayeredGlossary
+from .watch import Watcher
 
 import importlib.util
 
@@ -26,6 +28,7 @@ class Lang:
         else:
             self.cfg = {}
         self._glossary = None
+        self.watchers = []
 
     @property
     def advise_module_path(self):
@@ -47,12 +50,59 @@ class Lang:
         if not self._glossary:
             fname = self.gloss_path
             if os.path.isfile(fname):
-                self._glossary = Glossary.load(fname)
+                self._glossary = Glossary.load(fname, lazy=self.cfg.get('lazy', False),
+                                               snapshot=self.cfg.get('snapshot', False))
+                self._glossary.journal = self.cfg.get('journal', False)
             else:
                 self._glossary = Glossary()
                 self.path = os.path.dirname(fname)
+            layers = self.layer_paths
+            if layers:
+                # Lower layers are only read here, so they can share one
+                # mapped snapshot between workers.
+                base = [Glossary.load(path, lazy=self.cfg.get('lazy', False), snapshot=self.cfg.get('snapshot', False))
+                        for path in layers]
+                self._glossary = LayeredGlossary(base + [self._glossary])
+            interval = self.cfg.get('watch')
+            if interval:
+                # Pick up edits made outside langkit while we run.
+                layers = getattr(self._glossary, 'layers', [self._glossary])
+                self.watchers = [Watcher(g, interval).start() for g in layers if g.fname]
         return self._glossary
 
+    @property
+    def layer_paths(self):
+        """
+        Glossaries that this language's own glossary is layered on top
+        of, bottom first, from the "layers" list in cfg.json. Each item
+        is a language folder or a glossary file, relative to this folder.
+        """
+        paths = []
+        for item in self.cfg.get('layers', []):
+            path = os.path.normpath(os.path.join(self.path, item))
+            if os.path.isdir(path):
+                path = os.path.join(path, GLOSSARY_NAME)
+            paths.append(path)
+        return paths
+
+    @property
+    def tagger(self):
+        """
+        Which langkit.tagging backend splits up and tags text to translate,
+        from "tagger" in cfg.json: "nltk" (the default) or "builtin".
+        """
+        return self.cfg.get('tagger', 'nltk')
+
+    @property
+    def rewrite_rules(self):
+        """
+        The rules that normalize text before it's translated: the standard
+        ones, then any [pattern, replacement] pairs from "rewrite_rules" in
+        cfg.json, which see the text after the standard ones have run.
+        """
+        from .tcoach import rewrite_rules, snr
+        return rewrite_rules + [snr(*rule) for rule in self.cfg.get('rewrite_rules', [])]
+
     @property
     def cfg_path(self):
         return os.path.join(self.path, CFG_NAME)
@@ -0,0 +1,205 @@
+"""
+A read-through view over a stack of glossaries, such as a shared base
+vocabulary with a dialect's overlay on top of it.
+
+Nothing is copied into a combined glossary. Searches run against each
+layer separately and the sorted results are merged lazily, so a search
+that fills up early never touches the rest of the lower layers. An
+entry in a higher layer hides every entry with the same lemma beneath
+it. Changes always go to the top layer.
+"""
+import bisect
+import heapq
+
+from .glossary import (APPROX_BUDGET, APPROX_MAX_DISTANCE, APPROX_PREFIX, Entry, Glossary,
+                       compile_query, new_stats, tally, _change, _rank, _rank_term)
+
+
+def _lemma_index(glossary, lemma):
+    return bisect.bisect_left(glossary.entries, lemma, key=lambda x: x.lemma)
+
+
+def _has_lemma(glossary, lemma):
+    i = _lemma_index(glossary, lemma)
+    return i < glossary.lemma_count and glossary.entries[i].lemma == lemma
+
+
+def _holds(glossary, entry):
+    entries = glossary.entries
+    i = _lemma_index(glossary, entry.lemma)
+    while i < len(entries) and entries[i].lemma == entry.lemma:
+        if entries[i] is entry:
+            return True
+        i += 1
+    return False
+
+
+class LayeredGlossary:
+    """
+    Layers are listed from the bottom up; the last one is the top.
+    """
+    def __init__(self, layers):
+        if not layers:
+            raise ValueError("A layered glossary needs at least one layer.")
+        self.layers = list(layers)
+        # (generation, value) pairs, since counting means a walk over
+        # every layer.
+        self._count = None
+        self._stats = None
+
+    @property
+    def top(self) -> Glossary:
+        return self.layers[-1]
+
+    @property
+    def fname(self):
+        return self.top.fname
+
+    @property
+    def generation(self):
+        return sum(layer.generation for layer in self.layers)
+
+    def _shadowed(self, entry, level):
+        """Whether a layer above the given level has entry's lemma."""
+        return any(_has_lemma(layer, entry.lemma) for layer in self.layers[level + 1:])
+
+    def _visible(self, entries, level):
+        for entry in entries:
+            if not self._shadowed(entry, level):
+                yield entry
+
+    def _merged(self, streams):
+        # Equal lemmas come out top layer first; heapq.merge is stable.
+        return heapq.merge(*reversed(streams), key=lambda x: x.lemma)
+
+    @property
+    def entries(self):
+        """Every visible entry, in sort order. This is an iterator, not a list."""
+        return self._merged([self._visible(layer.entries, level)
+                             for level, layer in enumerate(self.layers)])
+
+    @property
+    def lemma_count(self):
+        generation = self.generation
+        stats = self._stats
+        if stats is not None and stats[0] == generation:
+            return stats[1]["unique entries"]
+        count = self._count
+        if count is None or count[0] != generation:
+            # Just counting doesn't have to parse lazy entries.
+            count = self._count = (generation, sum(1 for _ in self.entries))
+        return count[1]
+
+    @property
+    def stats(self):
+        generation = self.generation
+        cached = self._stats
+        if cached is None or cached[0] != generation:
+            stats = new_stats()
+            for entry in self.entries:
+                tally(stats, entry)
+                stats["unique entries"] += 1
+            cached = self._stats = (generation, stats)
+        return cached[1]
+
+    def find(self, expr, max_hits=5, exclude=None, try_fuzzy=False, ranked=False):
+        if isinstance(expr, str) and expr.startswith(APPROX_PREFIX):
+            return self.find_approx(expr, max_hits)
+        return self._find(compile_query(expr), max_hits, exclude, try_fuzzy, ranked)
+
+    def _find(self, plan, max_hits, exclude, try_fuzzy, ranked):
+        hits = []
+        if max_hits:
+            if ranked and _rank_term(plan):
+                hits = self._find_ranked(plan, max_hits, exclude)
+            else:
+                streams = [self._visible(layer._scan(plan, exclude), level)
+                           for level, layer in enumerate(self.layers)]
+                for entry in self._merged(streams):
+                    hits.append(entry)
+                    if len(hits) == max_hits:
+                        break
+            max_hits -= len(hits)
+        if try_fuzzy and max_hits and plan.fuzzy:
+            hits += self._find(plan.fuzzy, max_hits, list(exclude or []) + hits, False, ranked)
+        return hits
+
+    def _find_ranked(self, plan, max_hits, exclude):
+        term = _rank_term(plan)
+        best = []
+        for level, layer in enumerate(self.layers):
+            # Ask each layer for its own top hits, and for more if some of
+            # them turn out to be hidden by a higher layer.
+            want = max_hits
+            while True:
+                found = layer._find(plan, want, exclude, False, True)
+                visible = list(self._visible(found, level))
+                if len(visible) >= max_hits or len(found) < want or want < 0:
+                    break
+                want *= 2
+            best += [(_rank(entry, term), entry.lemma, -level, entry) for entry in visible]
+        best.sort(key=lambda x: x[:3])
+        if max_hits > 0:
+            best = best[:max_hits]
+        return [item[-1] for item in best]
+
+    def find_approx(self, expr, max_hits=5, max_distance=APPROX_MAX_DISTANCE, budget=APPROX_BUDGET):
+        best = []
+        for level, layer in enumerate(self.layers):
+            # Like _find_ranked(), but ranked by edit distance.
+            want = max_hits
+            while True:
+                found = layer._find_near(expr, want, max_distance, budget)
+                visible = [(d, entry) for d, entry in found if not self._shadowed(entry, level)]
+                if len(visible) >= max_hits or len(found) < want or want < 0:
+                    break
+                want *= 2
+            best += [(d, entry.lemma, -level, entry) for d, entry in visible]
+        best.sort(key=lambda x: x[:3])
+        if max_hits > 0:
+            best = best[:max_hits]
+        return [item[-1] for item in best]
+
+    def _owner(self, entry):
+        for layer in reversed(self.layers):
+            if _holds(layer, entry):
+                return layer
+        raise ValueError("Entry isn't in any layer of this glossary.")
+
+    def insert(self, entry: Entry):
+        self.top.insert(entry)
+
+    def delete(self, entry: Entry):
+        if self._owner(entry) is not self.top:
+            raise ValueError("Can't delete an entry that belongs to a lower layer.")
+        self.top.delete(entry)
+
+    def edit(self, entry: Entry, **changes):
+        """
+        Edit an entry. An entry from a lower layer is left alone; the
+        edited version is added to the top layer instead, where it hides
+        the original. Its lemma can't be changed, since the original
+        would then show through again.
+        """
+        if self._owner(entry) is not self.top:
+            if changes.get('lemma', entry.lemma) != entry.lemma:
+                raise ValueError("Can't rename an entry that belongs to a lower layer.")
+            # Made whole before it goes in, so readers never see an
+            # unedited copy hiding the original.
+            edited = _change(Entry(str(entry)), **changes)
+            self.top.insert(edited)
+            return edited
+        return self.top.edit(entry, **changes)
+
+    def batch(self, save=False):
+        return self.top.batch(save)
+
+    def insert_many(self, entries, save=False):
+        self.top.insert_many(entries, save)
+
+    def save(self, fname=None, handle=None, force: bool=False):
+        self.top.save(fname, handle, force)
+
+    def reload(self):
+        for layer in self.layers:
+            layer.reload()
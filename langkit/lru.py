@@ -0,0 +1,47 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A size-bounded mapping that evicts the least recently used item first.
+    Hit and miss counts are kept so callers can tell whether maxsize fits
+    their workload. Safe to share between threads.
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._items[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __str__(self):
+        return f"hits={self.hits} misses={self.misses} size={len(self)}/{self.maxsize}"
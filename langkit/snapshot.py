@@ -0,0 +1,127 @@
+"""
+A compiled sidecar for glossary.md that can be memory-mapped instead of
+parsed.
+
+Layout (all integers little-endian):
+
+    header   magic, version, source mtime_ns, source size, entry count,
+             length of the metadata block
+    metadata JSON with the text before and after the glossary table,
+             and the glossary's stats
+    starts   count + 1 uint32 offsets into the pool, one per row
+    lemmas   count uint32 lemma lengths; each row begins with its lemma
+    pool     canonical glossary rows, UTF-8, in sorted order
+
+The source file's mtime and size are recorded so a stale snapshot is
+never used. Rows stay in the mapped pages until an entry is parsed, so
+processes that map the same snapshot share them.
+"""
+import array
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+MAGIC = b'LKGS'
+VERSION = 1
+SUFFIX = '.snapshot'
+_HEADER = struct.Struct('<4sH2xqqII')
+
+
+def stamp(fname):
+    """Identify a particular version of a source file."""
+    st = os.stat(fname)
+    return st.st_mtime_ns, st.st_size
+
+
+def _uint32s(values):
+    a = array.array('I', values)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a.tobytes()
+
+
+def write(path, source_stamp, pre, post, rows, stats=None):
+    """
+    Write a snapshot. rows is a sequence of (lemma, row text) pairs, in
+    sort order, where each row text begins with its lemma.
+    """
+    meta = json.dumps({'pre': pre, 'post': post, 'stats': stats}).encode('utf-8')
+    starts = [0]
+    lemma_lens = []
+    pool = []
+    size = 0
+    for lemma, row in rows:
+        data = row.encode('utf-8')
+        lemma_lens.append(len(lemma.encode('utf-8')))
+        pool.append(data)
+        size += len(data)
+        starts.append(size)
+    header = _HEADER.pack(MAGIC, VERSION, source_stamp[0], source_stamp[1], len(lemma_lens), len(meta))
+    # A unique name next to the real file, so two writers can't interleave.
+    folder, name = os.path.split(path)
+    fd, tmp = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=folder or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(meta)
+            f.write(_uint32s(starts))
+            f.write(_uint32s(lemma_lens))
+            f.writelines(pool)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def read(path, source_stamp):
+    """
+    Map a snapshot. Returns (metadata, rows), where rows is a list of
+    (lemma, row) pairs and each row is a memoryview into the mapped file;
+    or None if the snapshot is missing, malformed or stale.
+    """
+    try:
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mm) < _HEADER.size:
+        return None
+    magic, version, mtime_ns, size, count, meta_len = _HEADER.unpack_from(mm)
+    if magic != MAGIC or version != VERSION or (mtime_ns, size) != tuple(source_stamp):
+        return None
+    i = _HEADER.size
+    if len(mm) < i + meta_len + 4 * (2 * count + 1):
+        return None
+    view = memoryview(mm)
+    try:
+        meta = json.loads(str(view[i:i + meta_len], 'utf-8'))
+    except ValueError:
+        return None
+    i += meta_len
+    starts = view[i:i + 4 * (count + 1)].cast('I')
+    i += 4 * (count + 1)
+    lemma_lens = view[i:i + 4 * count].cast('I')
+    i += 4 * count
+    if sys.byteorder != 'little':
+        starts = array.array('I', starts)
+        starts.byteswap()
+        lemma_lens = array.array('I', lemma_lens)
+        lemma_lens.byteswap()
+    pool = view[i:]
+    if starts[0] != 0 or starts[count] != len(pool):
+        return None
+    rows = []
+    try:
+        for n in range(count):
+            start, end = starts[n], starts[n + 1]
+            if end < start or lemma_lens[n] > end - start:
+                return None
+            row = pool[start:end]
+            rows.append((str(row[:lemma_lens[n]], 'utf-8'), row))
+    except ValueError:
+        return None
+    return meta, rows
@@ -0,0 +1,113 @@
+"""
+A symmetric-delete index for finding words within a small edit distance
+of a query.
+
+Every word is filed under each string that's left when up to
+max_distance chars are deleted from its first PREFIX chars. Two words
+within max_distance edits of each other always share one of those
+strings, so a search only has to compute edit distances for the words
+filed under the query's own deletes. Adding a word is a few dozen hash
+inserts, which keeps building the index for a big glossary cheap.
+"""
+import threading
+import time
+
+# Only the start of each word is used for keys, which bounds the number
+# of keys per word no matter how long the word is.
+PREFIX = 7
+
+
+def deletes(word, max_distance):
+    """Every string made by deleting up to max_distance chars from word."""
+    n = len(word)
+    if max_distance == 2:
+        # The usual case, spelled out because building an index is mostly this.
+        found = {word[:i] + word[i + 1:j] + word[j + 1:] for i in range(n) for j in range(i + 1, n)}
+        found.update([word[:i] + word[i + 1:] for i in range(n)])
+        found.add(word)
+        return found
+    found = {word}
+    edge = found
+    for _ in range(max_distance):
+        edge = {w[:i] + w[i + 1:] for w in edge for i in range(len(w))} - found
+        found |= edge
+    return found
+
+
+def bounded_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 if it's more than limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings."""
+    return bounded_distance(a, b, max(len(a), len(b)))
+
+
+class DeleteIndex:
+    """
+    Maps words to sets of ids, and finds the words near a query word, for
+    distances up to the max_distance it was made with. Words are never
+    taken out; when their last id goes, they just stop showing up in
+    results. Id sets are replaced rather than changed, and key lists are
+    only appended to, so searches can run while words are being added.
+    """
+    def __init__(self, max_distance=2):
+        self.max_distance = max_distance
+        self.ids = {}
+        self.keys = {}
+        # Words may be added from a background build and by writers at once.
+        self._lock = threading.Lock()
+
+    def add(self, word, id):
+        with self._lock:
+            ids = self.ids.get(word)
+            self.ids[word] = frozenset({id}) if ids is None else ids | {id}
+            if ids is None:
+                for key in deletes(word[:PREFIX], self.max_distance):
+                    words = self.keys.get(key)
+                    if words is None:
+                        self.keys[key] = [word]
+                    else:
+                        words.append(word)
+
+    def discard(self, word, id):
+        with self._lock:
+            ids = self.ids.get(word)
+            if ids is not None:
+                self.ids[word] = ids - {id}
+
+    def search(self, word, max_distance, deadline=None):
+        """
+        Return (distance, word, ids) for every word within max_distance,
+        nearest first. If deadline (a time.perf_counter() value) passes,
+        return whatever has been found so far.
+        """
+        if max_distance > self.max_distance:
+            raise ValueError(f"This index only finds words up to {self.max_distance} edits away.")
+        candidates = set()
+        for key in deletes(word[:PREFIX], max_distance):
+            candidates.update(self.keys.get(key, ()))
+        found = []
+        for n, candidate in enumerate(candidates, 1):
+            ids = self.ids.get(candidate)
+            if ids:
+                d = bounded_distance(word, candidate, max_distance)
+                if d <= max_distance:
+                    found.append((d, candidate, ids))
+            if deadline is not None and not n % 64 and time.perf_counter() > deadline:
+                break
+        found.sort(key=lambda x: (x[0], x[1]))
+        return found
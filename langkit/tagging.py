@@ -0,0 +1,323 @@
+"""
+Backends that split text into sentences and words and tag each word
+with its Penn Treebank part of speech, which is what TranslationCoach
+and advise functions work with.
+
+A backend is any object with these methods:
+
+    sent_tokenize(text) -> list of sentences
+    word_tokenize(sentence) -> list of words
+    tag_sents(sentences) -> list of [(word, tag), ...], one per sentence
+
+NltkBackend is the most accurate, but needs nltk and its models, which
+it downloads the first time if they're missing. LexiconBackend needs
+nothing but the word lists in langkit/data; it is much faster and less
+accurate, and never touches the network.
+"""
+import re
+
+from .bfr import LEXICON, read_word_list
+from .lru import LRUCache
+
+# nltk takes a good while to import, and most lk commands never need it,
+# so it's loaded the first time something does.
+_nltk = None
+
+def load_nltk():
+    """Import nltk, downloading the resources we use if need be."""
+    global _nltk
+    if _nltk is None:
+        import nltk
+        for resource, name in [('tokenizers/punkt', 'punkt'),
+                               ('taggers/averaged_perceptron_tagger', 'averaged_perceptron_tagger')]:
+            try:
+                nltk.data.find(resource)
+            except LookupError:
+                nltk.download(name, quiet=True)
+        import nltk.tag.perceptron
+        import nltk.tokenize
+        _nltk = nltk
+    return _nltk
+
+# nltk.pos_tag() loads its model all over again on every call, so we
+# load one tagger the first time we need it and keep it.
+_tagger = None
+
+def get_tagger():
+    global _tagger
+    if _tagger is None:
+        _tagger = load_nltk().tag.perceptron.PerceptronTagger()
+    return _tagger
+
+def pos_tag_sents(sentences):
+    """Tag a list of tokenized sentences in one go, like nltk.pos_tag_sents()."""
+    return get_tagger().tag_sents(sentences)
+
+
+class NltkBackend:
+    """Punkt sentences, Treebank words and the averaged perceptron tagger."""
+    name = 'nltk'
+
+    def sent_tokenize(self, text):
+        return load_nltk().tokenize.sent_tokenize(text)
+
+    def word_tokenize(self, sentence):
+        return load_nltk().tokenize.word_tokenize(sentence)
+
+    def tag_sents(self, sentences):
+        return pos_tag_sents(sentences)
+
+
+# Which tag each of the word lists in langkit/data stands for, in the order
+# that ties are broken when context doesn't help.
+WORD_LISTS = [('nouns', 'NN'), ('verbs', 'VB'), ('adjectives', 'JJ'), ('adverbs', 'RB')]
+
+# Words that the lists don't cover, or that are almost always one thing.
+CLOSED_CLASSES = {
+    'DT': "the a an this that these those each every another either neither no some any all",
+    'PRP': "i me you he him she her it we us they them myself yourself himself herself itself "
+           "ourselves yourselves themselves",
+    'PRP$': "my your his its our their",
+    'IN': "of in on at by for with from about into onto over under after before between through "
+          "during without within against among around near since until upon than because while "
+          "although though if whether as like across behind beyond toward towards",
+    'CC': "and or but nor",
+    'TO': "to",
+    'MD': "can could will would shall should may might must 'll 'd",
+    'WDT': "which",
+    'WP': "who whom what",
+    'WP$': "whose",
+    'WRB': "where when why how",
+    'EX': "there",
+    'RB': "not n't never",
+    'UH': "yes oh hello",
+    'CD': "one two three four five six seven eight nine ten eleven twelve twenty hundred thousand million",
+    'VB': "be",
+    'VBP': "am are 're 've 'm",
+    'VBZ': "is has does 's",
+    'VBD': "was were had did",
+    'VBN': "been done",
+    'VBG': "being having doing",
+}
+CLOSED_WORDS = {word for words in CLOSED_CLASSES.values() for word in words.split()}
+
+NOUNISH = {'NN', 'NNS', 'NNP', 'NNPS', 'PRP', 'CD'}
+# After these, an ambiguous word is probably a noun or adjective...
+NOMINAL_CONTEXT = {'DT', 'PRP$', 'JJ', 'JJR', 'JJS', 'POS', 'CD', 'IN', 'VB', 'VBD', 'VBZ', 'VBP'}
+# ...and after these, probably a verb.
+VERBAL_CONTEXT = {'MD', 'TO', 'PRP', 'NN', 'NNS', 'NNP', 'WDT', 'WP', 'RB'}
+HAVE_OR_BE = {'have', 'has', 'had', 'having', "'ve", 'be', 'am', 'is', 'are', 'was', 'were',
+              'been', 'being', "'m", "'re"}
+SINGULAR_SUBJECTS = {'he', 'she', 'it', 'this', 'that', 'there', 'what', 'who'}
+
+# Word endings of unknown words, longest first, and what they suggest.
+SUFFIXES = [
+    ('tion', 'NN'), ('sion', 'NN'), ('ment', 'NN'), ('ness', 'NN'), ('ship', 'NN'), ('hood', 'NN'),
+    ('ance', 'NN'), ('ence', 'NN'), ('ism', 'NN'), ('ist', 'NN'), ('ity', 'NN'),
+    ('able', 'JJ'), ('ible', 'JJ'), ('ous', 'JJ'), ('ful', 'JJ'), ('ive', 'JJ'), ('less', 'JJ'),
+    ('ish', 'JJ'), ('ical', 'JJ'), ('ary', 'JJ'), ('al', 'JJ'), ('ic', 'JJ'),
+    ('ize', 'VB'), ('ise', 'VB'), ('ify', 'VB'), ('ate', 'VB'),
+    ('ly', 'RB'), ('ing', 'VBG'), ('ed', 'VBD'), ('s', 'NNS'),
+]
+
+_SENT_END = re.compile(r"""[.!?]+['")\]]*(?=\s+['"(\[]*[A-Z0-9])""")
+_ABBREVIATIONS = {'mr', 'mrs', 'ms', 'dr', 'st', 'prof', 'sr', 'jr', 'vs', 'etc', 'e.g', 'i.e'}
+_WORD = re.compile(r"""
+    \d+(?:[.,:]\d+)*            # numbers, times
+  | (?:[A-Za-z]\.){2,}          # initialisms such as U.S.
+  | (?:mrs?|ms|dr|st|prof|[sj]r|vs|etc)\.  # a few abbreviations
+  | \w+(?=n't\b)                # the "do" in "don't"
+  | can(?=not\b)               # and the "can" in "cannot"
+  | n't\b
+  | '(?:s|re|ve|ll|d|m)\b       # clitics
+  | \w+(?:-\w+)*                # words, with hyphens
+  | \.\.\.|--|[^\w\s]           # punctuation
+""", re.VERBOSE | re.IGNORECASE)
+
+# Built the first time a LexiconBackend tags something.
+_lexicon = None
+
+def load_lexicon():
+    """
+    Map lowercased words to the tags they might have, most likely first.
+    """
+    global _lexicon
+    if _lexicon is None:
+        lexicon = {}
+        def add(word, tag):
+            tags = lexicon.setdefault(word, [])
+            if tag not in tags:
+                tags.append(tag)
+        for name, tag in WORD_LISTS:
+            for word in read_word_list(name):
+                add(word, tag)
+        # Inflections of those words, and irregular verbs, from bfr.
+        for tag, words in LEXICON.items():
+            for word in words:
+                add(word, tag)
+        # Closed classes win over the open ones; "up" is not a noun here.
+        for tag, words in CLOSED_CLASSES.items():
+            for word in words.split():
+                lexicon[word] = [tag]
+        _lexicon = {word: tuple(tags) for word, tags in lexicon.items()}
+    return _lexicon
+
+
+def _stems(word, ending, extra=''):
+    """Ways word might be something plus ending, such as 'tried' = 'try' + 'ed'."""
+    if not word.endswith(ending) or len(word) <= len(ending) + 1:
+        return []
+    stem = word[:-len(ending)]
+    stems = [stem, stem + extra] if extra else [stem]
+    if len(stem) > 2 and stem[-1] == stem[-2]:
+        stems.append(stem[:-1])
+    if stem.endswith('i'):
+        stems.append(stem[:-1] + 'y')
+    return stems
+
+
+class LexiconBackend:
+    """
+    Regex tokenizers and a tagger that looks words up in the langkit/data
+    word lists, recognizes regular inflections of them, guesses at the
+    rest from their endings, and uses the previous tag to choose between
+    the readings of ambiguous words.
+    """
+    name = 'builtin'
+
+    def __init__(self):
+        self._guesses = LRUCache(8192)
+
+    def __reduce__(self):
+        # Workers of hints_many() start with an empty cache.
+        return (LexiconBackend, ())
+
+    def sent_tokenize(self, text):
+        sentences = []
+        start = 0
+        for m in _SENT_END.finditer(text):
+            last = text[start:m.start()].rsplit(None, 1)
+            if m.group() == '.' and last and last[-1].lower() in _ABBREVIATIONS:
+                continue
+            sentences.append(text[start:m.end()].strip())
+            start = m.end()
+        rest = text[start:].strip()
+        if rest:
+            sentences.append(rest)
+        return sentences
+
+    def word_tokenize(self, sentence):
+        return _WORD.findall(sentence)
+
+    def tag_sents(self, sentences):
+        return [self.tag(words) for words in sentences]
+
+    def _readings(self, word):
+        """The tags that a lowercased word might have, most likely first."""
+        lexicon = load_lexicon()
+        tags = lexicon.get(word)
+        if tags is not None:
+            return tags
+        tags = self._guesses.get(word)
+        if tags is None:
+            tags = self._guess(word, lexicon)
+            self._guesses.put(word, tags)
+        return tags
+
+    def _guess(self, word, lexicon):
+        def known(stems, tag):
+            return any(tag in lexicon.get(stem, ()) for stem in stems)
+        tags = []
+        stems = _stems(word, 's') + _stems(word, 'es')
+        if known(stems, 'NN'):
+            tags.append('NNS')
+        if known(stems, 'VB'):
+            tags.append('VBZ')
+        if known(_stems(word, 'ed', 'e') + _stems(word, 'd'), 'VB'):
+            tags += ['VBD', 'VBN']
+        if known(_stems(word, 'ing', 'e'), 'VB'):
+            tags.append('VBG')
+        if known(_stems(word, 'er') + _stems(word, 'r'), 'JJ'):
+            tags.append('JJR')
+        if known(_stems(word, 'est') + _stems(word, 'st'), 'JJ'):
+            tags.append('JJS')
+        if known(_stems(word, 'ly'), 'JJ'):
+            tags.append('RB')
+        if tags:
+            return tuple(tags)
+        for suffix, tag in SUFFIXES:
+            if word.endswith(suffix) and len(word) > len(suffix) + 2:
+                return ('VBD', 'VBN') if tag == 'VBD' else (tag,)
+        # Let context decide between the two biggest classes.
+        return ('NN', 'VB')
+
+    def tag(self, words):
+        """Tag one tokenized sentence."""
+        tagged = []
+        prev = prev_word = None
+        for i, word in enumerate(words):
+            lower = word.lower()
+            if not word[0].isalnum() and lower not in load_lexicon():
+                tag = word
+            elif word[0].isdigit():
+                tag = 'CD'
+            elif word[0].isupper() and (i > 0 or word[-1] == '.') and lower not in load_lexicon():
+                tag = 'NNP'
+            else:
+                next_word = words[i + 1].lower() if i + 1 < len(words) else None
+                tag = self._choose(lower, self._readings(lower), prev, prev_word, next_word)
+            tagged.append((word, tag))
+            prev, prev_word = tag, lower
+        return tagged
+
+    def _choose(self, word, tags, prev, prev_word, next_word):
+        if word == "'s":
+            return 'POS' if prev in NOUNISH and prev_word not in SINGULAR_SUBJECTS else 'VBZ'
+        if word == 'her':
+            return 'PRP$' if next_word and next_word[0].isalnum() and not next_word in CLOSED_WORDS else 'PRP'
+        if word == 'that':
+            return 'WDT' if prev in NOUNISH and prev != 'PRP' else 'DT' if next_word and self._nominal(next_word) else 'IN'
+        if word == 'there':
+            return 'EX' if next_word in HAVE_OR_BE else 'RB'
+        if tags == ('VB',):
+            tags = ('VB', 'VBP')
+        if len(tags) == 1:
+            return tags[0]
+        if 'VBN' in tags and prev_word in HAVE_OR_BE:
+            return 'VBN'
+        if prev in ('MD', 'TO') or prev_word in ('do', 'does', 'did', "n't", 'not') and prev in ('VBP', 'VBZ', 'VBD', 'RB'):
+            for tag in ('VB', 'VBG', 'VBN'):
+                if tag in tags:
+                    return tag
+        if prev in VERBAL_CONTEXT:
+            for tag in ('VBZ', 'VBD', 'VBP', 'VB'):
+                if tag in tags:
+                    if tag == 'VB':
+                        return 'VBZ' if prev_word in SINGULAR_SUBJECTS else 'VBP'
+                    return tag
+        if prev is None and 'VB' in tags and load_lexicon().get(next_word) == ('DT',):
+            # An order, like "Fry the apple."
+            return 'VB'
+        if prev in NOMINAL_CONTEXT or prev is None:
+            if 'JJ' in tags and next_word and self._nominal(next_word):
+                return 'JJ'
+            for tag in ('NN', 'NNS', 'JJ'):
+                if tag in tags:
+                    return tag
+        return tags[0]
+
+    def _nominal(self, word):
+        return any(tag in ('NN', 'NNS', 'JJ') for tag in self._readings(word))
+
+
+BACKENDS = {
+    NltkBackend.name: NltkBackend,
+    LexiconBackend.name: LexiconBackend,
+}
+
+def get_backend(name=None):
+    """A new backend, given its name; nltk is the default."""
+    try:
+        return BACKENDS[name or NltkBackend.name]()
+    except KeyError:
+        raise ValueError(f"Unknown tagger {name!r}; expected one of {', '.join(sorted(BACKENDS))}.")
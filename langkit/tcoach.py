@@ -1,16 +1,12 @@
 import bisect
 from collections import namedtuple
-import nltk
-from nltk.tokenize import word_tokenize, sent_tokenize
+import json
+import os
 
 from .pos import find_by_nltk, PLACEHOLDER
 from .bfr import *
-
-# Download NLTK resources if needed.
-if not nltk.data.find('tokenizers/punkt'):
-    nltk.download('punkt', quiet=True)
-if not nltk.data.find('taggers/averaged_perceptron_tagger'):
-    nltk.download('averaged_perceptron_tagger', quiet=True)
+from .tagging import get_backend
+from . import snapshot as snap
 
 SimpleNormalizationRule = namedtuple('SimpleNormalizationRule', ['pattern', 'replacement'])
 SimpleNormalizationRule.apply = lambda self, text: text.replace(self.pattern, self.replacement)
@@ -31,6 +27,31 @@ rewrite_rules = [
     snr("it's", 'it is'),
 ]
 
+class Rewriter:
+    """
+    Applies rewrite rules in order, each to the output of the ones before
+    it, as if calling apply() on each in turn. Rules may be given as
+    (pattern, replacement) pairs, as they are in cfg.json.
+    """
+    def __init__(self, rules):
+        self.rules = [snr(*rule) for rule in rules]
+        if not all(rule.pattern for rule in self.rules):
+            raise ValueError("A rewrite rule needs a pattern.")
+        # Calling str.replace() straight off plain pairs saves most of the
+        # cost of short texts, such as lines streamed to hints_stream().
+        self._pairs = tuple((rule.pattern, rule.replacement) for rule in self.rules)
+
+    def __call__(self, text):
+        for pattern, replacement in self._pairs:
+            text = text.replace(pattern, replacement)
+        return text
+
+rewrite = Rewriter(rewrite_rules)
+
+# How many chars of a sentence TranslationCoach.hints_stream() will hold
+# on to while it waits for the sentence to end.
+MAX_LOOKAHEAD = 4096
+
 class Hint:
     """
     Represents a hint about how to translate an English word.
@@ -46,42 +67,167 @@ class Hint:
     def __repr__(self):
         return f"{self.word} pos={self.pos} lemma={self.lemma} approx={self.approx}"
     
+def _glossary_files(glossary):
+    """
+    Describe how to load a glossary again in another process, as a list
+    of (fname, lazy, snapshot) for each layer, or None if it can't be.
+    """
+    layers = getattr(glossary, 'layers', [glossary])
+    files = []
+    for layer in layers:
+        fname = getattr(layer, 'fname', None)
+        if not fname or layer._unsaved:
+            return None
+        files.append((fname, layer.lazy, layer.snapshot))
+    return files
+
+def _load_glossary(files):
+    from .glossary import Glossary
+    from .layered import LayeredGlossary
+    layers = [Glossary.load(fname, lazy, snapshot) for fname, lazy, snapshot in files]
+    return layers[0] if len(layers) == 1 else LayeredGlossary(layers)
+
+# The coach in each worker process of hints_many().
+_worker_coach = None
+
+def _init_worker(files, advise, memo_fname, backend, rules):
+    global _worker_coach
+    advise_func = None
+    if advise:
+        from .lang import _import_module_from_path
+        path, name = advise
+        advise_func = getattr(_import_module_from_path('advise', path), name)
+    _worker_coach = TranslationCoach(_load_glossary(files), advise_func, memo_fname, backend, rules)
+
+def _worker_hints(doc):
+    return list(_worker_coach.hints(doc))
+
 class TranslationCoach:
     """
-    Coaches on translation from English into a given language.
+    Coaches on translation from English into a given language. Text is
+    normalized with rewrite_rules, which default to the ones above, and
+    then split up and tagged by backend, which is a name or an object
+    from langkit.tagging; the default is nltk.
     """
-    def __init__(self, glossary, advise_func=None):
+    def __init__(self, glossary, advise_func=None, memo_fname=None, backend=None, rewrite_rules=None):
         self.glossary = glossary
         self.advise_func = advise_func
+        self.backend = get_backend(backend) if backend is None or isinstance(backend, str) else backend
+        self.rewrite = rewrite if rewrite_rules is None else Rewriter(rewrite_rules)
+        # Maps (word, nltk tag) to (pos, lemma, approx), for as long as
+        # the glossary doesn't change. With memo_fname, it's also kept
+        # between runs; see save_memo().
+        self.memo_fname = memo_fname
+        self._memo_data = {}
+        self._memo_generation = getattr(glossary, 'generation', None)
+        if memo_fname:
+            self._load_memo()
+
+    @property
+    def _memo(self):
+        generation = getattr(self.glossary, 'generation', None)
+        if generation != self._memo_generation:
+            self._memo_data = {}
+            self._memo_generation = generation
+        return self._memo_data
+
+    def _memo_stamps(self):
+        # What the memo was built from: each glossary file's mtime and size,
+        # and its journal's, since saves may only append to the journal.
+        from .glossary import JOURNAL_SUFFIX
+        files = _glossary_files(self.glossary)
+        if files is None:
+            return None
+        stamps = []
+        for fname, _, _ in files:
+            journal = fname + JOURNAL_SUFFIX
+            journal_stamp = list(snap.stamp(journal)) if os.path.exists(journal) else None
+            stamps.append([fname, *snap.stamp(fname), journal_stamp])
+        return stamps
+
+    def _load_memo(self):
+        try:
+            with open(self.memo_fname, 'rt') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        stamps = self._memo_stamps()
+        if stamps is None or saved.get('stamps') != stamps:
+            return
+        self._memo.update(((word, tag), (pos, lemma, approx)) for word, tag, pos, lemma, approx in saved['memo'])
+
+    def save_memo(self):
+        """
+        Write the memo to memo_fname, so the next run can start with it
+        if the glossary files haven't changed by then.
+        """
+        stamps = self._memo_stamps()
+        if not self.memo_fname or stamps is None:
+            return False
+        memo = [[word, tag, pos, lemma, approx] for (word, tag), (pos, lemma, approx) in self._memo.items()]
+        tmp = self.memo_fname + '.tmp'
+        with open(tmp, 'wt') as f:
+            json.dump({'stamps': stamps, 'memo': memo}, f)
+        os.replace(tmp, self.memo_fname)
+        return True
 
     def _find(self, expr):
-        hits = self.glossary.find(expr)
+        # Only the best hit is used, so rank by how closely it matches.
+        hits = self.glossary.find(expr, max_hits=1, ranked=True)
         if hits: return hits[0]
         # Automatically try putting verbs in infinitive form.
         if 'p:v' in expr:
             if 'd:to ' not in expr:
                 expr = expr.replace('d:', 'd:to ')
-                hits = self.glossary.find(expr)
+                hits = self.glossary.find(expr, max_hits=1, ranked=True)
                 if hits: return hits[0]
         # Many glossary definitions have explanatory notes about
         # senses, in parentheses. Try matching the word that way.
         if 'd:' in expr and '(' not in expr:
             expr += ' (*'
-            hits = self.glossary.find(expr)
+            hits = self.glossary.find(expr, max_hits=1, ranked=True)
             if hits: return hits[0]
 
     def hints(self, paragraph):
-        for nr in rewrite_rules:
-            paragraph = nr.apply(paragraph)
+        paragraph = self.rewrite(paragraph)
+        return self._hints(self.backend.sent_tokenize(paragraph))
 
-        sentences = sent_tokenize(paragraph)
-        for sentence in sentences:
+    def hints_stream(self, f, max_lookahead=MAX_LOOKAHEAD):
+        """
+        Like hints(), for text read a line at a time from a file object,
+        such as a whole book or sys.stdin. Only the sentence that hasn't
+        ended yet is held in memory, and hints for each sentence come out
+        as soon as the next line shows where it ends. A blank line always
+        ends a sentence; a sentence that runs past max_lookahead chars
+        without ending is cut at a space. Rewrite rules are applied a line
+        at a time.
+        """
+        pending = ''
+        for line in f:
+            if not line.strip():
+                if pending:
+                    yield from self._hints([pending])
+                    pending = ''
+                continue
+            text = pending + ' ' + self.rewrite(line) if pending else self.rewrite(line)
+            # The last sentence may go on in the next line, so keep it back.
+            *done, pending = self.backend.sent_tokenize(text) or ['']
+            while len(pending) > max_lookahead:
+                cut = pending.rfind(' ', 0, max_lookahead)
+                if cut <= 0:
+                    cut = max_lookahead
+                done.append(pending[:cut])
+                pending = pending[cut:].lstrip()
+            if done:
+                yield from self._hints(done)
+        if pending:
+            yield from self._hints([pending])
 
-            # Tokenize the sentence into words
-            words = word_tokenize(sentence)
-
-            # Perform POS tagging
-            pos_tags = nltk.pos_tag(words)
+    def _hints(self, sentences):
+        # Tokenize each sentence into words, then tag them all at once.
+        backend = self.backend
+        sentences = [backend.word_tokenize(s) for s in sentences]
+        for pos_tags in backend.tag_sents(sentences):
 
             # See if an adviser will help us translate this sentence. This allows
             # externally loaded custom logic on a per-language basis.
@@ -91,7 +237,6 @@ class TranslationCoach:
             # Now do the general translation work: look up each word in the glossary.
             i = 0
             for tag in pos_tags:
-                entry = None
                 approx = False
                 word, pos = tag
                 
@@ -112,38 +257,78 @@ class TranslationCoach:
                 else:
                     # Normalize case; glossary should have lower-case form of word.
                     if word != "I": word = word.lower()
-                    # See if we can convert from nltk parts of speech to the ones used
-                    # by lk (LangKit). If yes, we can use POS to look up the word in the
-                    # glossary with higher precision.
-                    lk_pos = find_by_nltk(pos)
-                    if lk_pos and lk_pos.lk:
-                        # Lk might have more than one POS for a given nltk category;
-                        # look for the word in glossary definitions using each POS
-                        # until we find a match.
-                        for x in lk_pos.lk.split():
-                            expr = f'p:{x} d:{word}'
-                            if DEBUG: print(expr)
-                            entry = self._find(expr)
-                            if entry:
-                                if DEBUG: print("found")
-                                pos = x
-                                break
-                    if not entry:
-                        # Try looking up the exact word, without a part of speech.
-                        entry = self._find(f'd:{word}')
-                        if not entry:
-                            # Try doing base form reduction on the word. This
-                            # will uninflect verbs, among other things.
-                            bfr_word, new_pos = bfr(word, tag[1])
-                            if bfr_word:
-                                expr = f'p:{new_pos} d:{bfr_word}'
-                                if DEBUG: print(expr)
-                                entry = self._find(expr)
-                                if entry:
-                                    pos = new_pos
-                                    approx = True
-                    lemma = None
-                    if entry:
-                        lemma = entry if isinstance(entry, str) else entry.lemma
+                    # Common words come up over and over, so remember how
+                    # each one resolved.
+                    key = (word, pos)
+                    found = self._memo.get(key)
+                    if found is None:
+                        found = self._memo[key] = self._lookup(word, pos)
+                    pos, lemma, approx = found
                 yield Hint(word, pos, lemma, approx)
                 i += 1
+
+    def _lookup(self, word, pos):
+        """
+        Find a word in the glossary, given its nltk part of speech.
+        Returns (pos, lemma, approx).
+        """
+        entry = None
+        approx = False
+        nltk_pos = pos
+        # See if we can convert from nltk parts of speech to the ones used
+        # by lk (LangKit). If yes, we can use POS to look up the word in the
+        # glossary with higher precision.
+        lk_pos = find_by_nltk(pos)
+        if lk_pos and lk_pos.lk:
+            # Lk might have more than one POS for a given nltk category;
+            # look for the word in glossary definitions using each POS
+            # until we find a match.
+            for x in lk_pos.lk.split():
+                expr = f'p:{x} d:{word}'
+                if DEBUG: print(expr)
+                entry = self._find(expr)
+                if entry:
+                    if DEBUG: print("found")
+                    pos = x
+                    break
+        if not entry:
+            # Try looking up the exact word, without a part of speech.
+            entry = self._find(f'd:{word}')
+            if not entry:
+                # Try doing base form reduction on the word. This
+                # will uninflect verbs, among other things.
+                bfr_word, new_pos = bfr(word, nltk_pos)
+                if bfr_word:
+                    expr = f'p:{new_pos} d:{bfr_word}'
+                    if DEBUG: print(expr)
+                    entry = self._find(expr)
+                    if entry:
+                        pos = new_pos
+                        approx = True
+        lemma = None
+        if entry:
+            lemma = entry if isinstance(entry, str) else entry.lemma
+        return pos, lemma, approx
+
+    def hints_many(self, docs, processes=None, chunksize=4):
+        """
+        Get hints for many documents at once, spread over a pool of
+        processes that each load the glossary once. Yields a list of
+        hints per document, in the same order as docs. Workers load the
+        glossary from disk, so it mustn't have unsaved changes; if it
+        does, or if processes is 1, the work is done here instead.
+        """
+        files = _glossary_files(self.glossary)
+        advise = None
+        if self.advise_func:
+            # Functions from advise.py can't be pickled by reference, so
+            # workers import the file themselves.
+            code = getattr(self.advise_func, '__code__', None)
+            advise = (code.co_filename, self.advise_func.__name__) if code else None
+        if processes == 1 or files is None or (self.advise_func and not advise):
+            for doc in docs:
+                yield list(self.hints(doc))
+            return
+        import multiprocessing
+        with multiprocessing.Pool(processes, _init_worker, (files, advise, self.memo_fname, self.backend, self.rewrite.rules)) as pool:
+            yield from pool.imap(_worker_hints, docs, chunksize)
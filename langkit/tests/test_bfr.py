@@ -26,4 +26,14 @@ def test_bfr():
     assert bfr('childlike', 'JJ') == ('child', 'n')
     assert bfr('windy', 'JJ') == ('wind', 'n')
     assert bfr('heavenly', 'JJ') == ('heaven', 'n')
-    
\ No newline at end of file
+    
+def test_lexicon():
+    # The rules alone would make these stopp, tri and bett.
+    assert bfr('stopped', 'VBD') == ('stop', 'v')
+    assert bfr('tried', 'VBN') == ('try', 'v')
+    assert bfr('better', 'JJR') == ('good', 'ad')
+    assert bfr('studies', 'NNS') == ('study', 'n')
+    assert bfr('children', 'NNS') == ('child', 'n')
+    assert LEXICON['VBD']['went'] == ('go', 'v')
+    assert find_regular(irregular_past, 'went') == 'go'
+    assert find_regular(irregular_past, 'walked') is None
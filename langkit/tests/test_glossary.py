@@ -1,4 +1,5 @@
 from ..glossary import *
+from ..gindex import bit_ids, FOLD_AT
 
 import io
 import os
@@ -48,6 +49,10 @@ def test_searchexpr_starter():
     assert_starter("def:abc tags:v", "")
     assert_starter("lem:*abc notes:notes pos:v", "")
     
+def test_searchexpr_pos_is_tag():
+    assert str(SearchExpr("p:v d:walk")) == "t:v d:walk"
+    assert str(SearchExpr("pos:n")) == "t:n"
+
 def test_searchexpr_fuzzify():
     def assert_fuzzy(expr, fuzzy_equiv):
         se = SearchExpr(expr)
@@ -163,3 +168,453 @@ def test_find_defn_wildcards():
 def test_find_anywhere():
     assert len(g.find('swallow')) == 1
     assert len(g.find('vinegar', try_fuzzy=True)) == 1
+
+def brute_force_find(glossary, expr, max_hits=5):
+    se = SearchExpr(expr)
+    return [e for e in glossary.entries if se.matches(e)][:max_hits]
+
+INDEXED_QUERIES = [
+    'd:a yellow fruit', 'd:*fruit', 'd:a*', 'd:a r*', 'd:*!fruit', 'd:*fru*',
+    'd:to cook*', 'd:to move food from mouth to stomach', 'd:!to *oil',
+    'fry', 'swallow', 'jonathan', 'd:jonathan', 'a*', 'd:nothing here',
+    'd:*e.g.*', 'l:fr* d:to*', 't:n', 't:v d:to*', 'p:n d:a*', 'pos:a', 't:?',
+    't:x', 'p:n*', 'l:*ick*', 'l:?ry', 'l:*!ba*', 'n:*serial*', 'n:*nothing*',
+    '*!ple*', 'd:*ugar*', 'd:*!cucumber*', '*!swal*', 'd:*!to*cook*', 'd:*ll*w*',
+]
+
+def test_find_matches_brute_force():
+    for expr in INDEXED_QUERIES:
+        assert g.find(expr) == brute_force_find(g, expr), expr
+
+def test_defn_index_candidates():
+    assert g.index.defn_ids(MatchExpr('a yellow fruit')) == {g.index.ids[g.find('l:banana')[0]]}
+    assert len(g.index.defn_ids(MatchExpr('*!fruit'))) == 2
+    assert len(g.index.defn_ids(MatchExpr('a r*'))) == 1
+    assert g.index.defn_ids(MatchExpr('*fruit')) is None
+    assert g.index.defn_ids(MatchExpr('*e.g.*')) is None
+    assert not g.index.defn_ids(MatchExpr('nothing here'))
+
+def test_index_follows_mutations():
+    gl = Glossary.load(SAMPLE_GLOSS_PATH)
+    assert not gl.find('d:a green fruit')
+    lime = Entry(("lime", "n", "a green fruit", ""))
+    gl.insert(lime)
+    assert gl.find('d:a green fruit') == [lime]
+    lime = gl.edit(lime, lemma="key lime", defn="a small green fruit")
+    assert not gl.find('d:a green fruit')
+    assert gl.find('d:a small*') == [lime]
+    assert gl.find('l:key*') == [lime]
+    gl.delete(lime)
+    assert not gl.find('d:a small*')
+    for expr in INDEXED_QUERIES:
+        assert gl.find(expr) == brute_force_find(gl, expr), expr
+
+def test_tag_index():
+    bits = g.index.tag_bits(MatchExpr('n'))
+    assert {g.index.by_id[id].lemma for id in bit_ids(bits)} == {'apple', 'banana', 'pickle'}
+    assert g.index.tag_bits(MatchExpr('?')) == g.index.tag_bits(MatchExpr('*'))
+    assert g.index.tag_bits(MatchExpr('x')) == 0
+    assert [e.lemma for e in g.find('p:v d:to*')] == ['fry', 'swallow']
+    assert not g.find('p:n d:to*')
+
+def test_compile_query():
+    plan = compile_query('p:v d:to cook')
+    assert compile_query('p:v d:to cook') is plan
+    assert str(plan) == 't:v d:to cook'
+    assert str(plan.fuzzy) == 't:v d:*!to*cook*'
+    assert plan.fuzzy.fuzzy is None
+    assert plan == QueryPlan.from_search_expr(SearchExpr('p:v d:to cook'))
+    hits = PLAN_CACHE.hits
+    compile_query('p:v d:to cook')
+    assert PLAN_CACHE.hits == hits + 1
+
+def test_find_fuzzy_leaves_search_expr_alone():
+    se = SearchExpr('d:cucumber')
+    assert g.find(se, try_fuzzy=True)
+    assert str(se) == 'd:cucumber'
+
+def test_find_results_cached_until_change():
+    gl = Glossary.load(SAMPLE_GLOSS_PATH)
+    first = gl.find('d:*fruit')
+    hits = gl._results.hits
+    first.append('junk')
+    assert gl.find('d:*fruit') == first[:-1]
+    assert gl._results.hits == hits + 1
+    generation = gl.generation
+    kiwi = Entry(("kiwi", "n", "a fuzzy fruit", ""))
+    gl.insert(kiwi)
+    assert gl.generation == generation + 1
+    assert kiwi in gl.find('d:*fruit')
+    gl.reload()
+    assert gl.generation == generation + 2
+    assert kiwi not in gl.find('d:*fruit')
+
+def test_load_sorted_file_round_trips(tmp_path):
+    fname = tmp_path / 'glossary.md'
+    g_md.save(str(fname))
+    reloaded = Glossary.load(str(fname))
+    assert [str(e) for e in reloaded.entries] == [str(e) for e in g_md.entries]
+    buf = io.StringIO()
+    reloaded.save(handle=buf)
+    assert buf.getvalue() == fname.read_text()
+
+def test_load_reports_line_numbers(tmp_path):
+    fname = tmp_path / 'glossary.md'
+    fname.write_text(HEADER + '\n' + DIVIDER + '\nfry|v|to cook\n\nstray text\nzap|v|to shock\n')
+    try:
+        Glossary.load(str(fname))
+        assert False
+    except Exception as ex:
+        assert str(ex) == "Didn't expect a new entry on line 6."
+
+def test_lazy_load():
+    lazy = Glossary.load(SAMPLE_MD_GLOSS_PATH, lazy=True)
+    assert [e.lemma for e in lazy.entries] == [e.lemma for e in g_md.entries]
+    assert not any(e.parsed for e in lazy.entries)
+    assert lazy.find('l:fry')
+    assert not any(e.parsed for e in lazy.entries)
+    assert lazy.find('d:a yellow fruit')[0].lemma == 'banana'
+    assert all(e.parsed for e in lazy.entries)
+
+def test_lazy_save_keeps_rows(tmp_path):
+    fname = str(tmp_path / 'glossary.md')
+    rows = ["abc | v n | ~zed / alpha", "bcd|n|a thing|  ", "cde | n | a fruit | "]
+    with open(fname, 'w') as f:
+        f.write('\n'.join([HEADER, DIVIDER] + rows) + '\n')
+    lazy = Glossary.load(fname, lazy=True)
+    kiwi = Entry(("kiwi", "n", "a fuzzy fruit", ""))
+    lazy.insert(kiwi)
+    lazy.edit(lazy.find('l:cde')[0], notes="sweet")
+    lazy.save()
+    # Rows nobody touched are written just as they were read.
+    with open(fname) as f:
+        assert f.read().splitlines()[2:] == rows[:2] + ["cde | n | a fruit | sweet", str(kiwi)]
+    assert not any(e.parsed for e in lazy.entries[:2])
+
+def test_slotted_items_share_kinds():
+    a, b = DefnItem('~walk (on foot)'), DefnItem('~run')
+    assert a.kind is b.kind
+    assert not hasattr(a, '__dict__')
+    assert not hasattr(Entry(("abc", "n", "x", "")), '__dict__')
+
+def copy_sample(tmp_path):
+    fname = str(tmp_path / 'glossary.md')
+    with open(SAMPLE_MD_GLOSS_PATH) as src, open(fname, 'w') as dest:
+        dest.write(src.read())
+    return fname
+
+def test_snapshot(tmp_path):
+    fname = copy_sample(tmp_path)
+    built = Glossary.load(fname, snapshot=True)
+    assert os.path.isfile(fname + '.snapshot')
+    mapped = Glossary.load(fname, snapshot=True)
+    assert not any(e.parsed for e in mapped.entries)
+    assert mapped.pre == built.pre and mapped.post == built.post
+    assert [str(e) for e in mapped.entries] == [str(e) for e in built.entries]
+    assert mapped.find('d:a yellow fruit')[0].lemma == 'banana'
+    # A changed source file makes the snapshot stale.
+    mapped.insert(Entry(("kiwi", "n", "a fuzzy fruit", "")))
+    mapped.save()
+    reloaded = Glossary.load(fname, snapshot=True)
+    assert reloaded.find('l:kiwi')
+    assert reloaded.entries[0].parsed
+
+def test_snapshot_damaged(tmp_path):
+    fname = copy_sample(tmp_path)
+    built = Glossary.load(fname, snapshot=True)
+    with open(fname + '.snapshot', 'rb') as f:
+        data = f.read()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+    # A damaged snapshot is ignored, and the source is parsed instead.
+    for damaged in [data[:-1], data[:-20], data[:len(data) // 2], data[:40], data + b'x',
+                    data[:40] + b'\xff' * 8 + data[48:]]:
+        with open(fname + '.snapshot', 'wb') as f:
+            f.write(damaged)
+        loaded = Glossary.load(fname, snapshot=True)
+        assert [str(e) for e in loaded.entries] == [str(e) for e in built.entries]
+
+def test_save_is_atomic(tmp_path, monkeypatch):
+    fname = copy_sample(tmp_path)
+    gl = Glossary.load(fname)
+    gl.insert(Entry(("kiwi", "n", "a fuzzy fruit", "")))
+    def crash(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, 'replace', crash)
+    try:
+        gl.save()
+        assert False
+    except OSError:
+        pass
+    assert not Glossary.load(fname).find('l:kiwi')
+    assert os.listdir(tmp_path) == ['glossary.md']
+
+def test_journal(tmp_path):
+    fname = copy_sample(tmp_path)
+    gl = Glossary.load(fname)
+    gl.journal = True
+    original = open(fname).read()
+    kiwi = Entry(("kiwi", "n", "a fuzzy fruit", ""))
+    gl.insert(kiwi)
+    gl.save()
+    gl.edit(kiwi, defn="a fuzzy green fruit")
+    gl.delete(gl.find('l:fry')[0])
+    gl.save()
+    assert open(fname).read() == original
+    reloaded = Glossary.load(fname)
+    assert [str(e) for e in reloaded.entries] == [str(e) for e in gl.entries]
+    gl.compact()
+    assert not os.path.exists(fname + '.journal')
+    assert [str(e) for e in Glossary.load(fname).entries] == [str(e) for e in gl.entries]
+
+def test_stale_journal_ignored(tmp_path):
+    fname = copy_sample(tmp_path)
+    gl = Glossary.load(fname)
+    gl.journal = True
+    gl.insert(Entry(("kiwi", "n", "a fuzzy fruit", "")))
+    gl.save()
+    with open(fname, 'a') as f:
+        f.write('\nmore text\n')
+    assert not Glossary.load(fname).find('l:kiwi')
+
+def test_save_after_stale_journal(tmp_path):
+    fname = copy_sample(tmp_path)
+    gl = Glossary.load(fname)
+    gl.journal = True
+    gl.insert(Entry(("kiwi", "n", "a fuzzy fruit", "")))
+    gl.save()
+    with open(fname, 'a') as f:
+        f.write('\nmore text\n')
+    gl = Glossary.load(fname)
+    gl.journal = True
+    gl.insert(Entry(("lime", "n", "a green fruit", "")))
+    gl.save()
+    # Appending to the stale journal would have lost the lime.
+    assert Glossary.load(fname).find('l:lime')
+
+def test_journal_cut_off(tmp_path):
+    fname = copy_sample(tmp_path)
+    gl = Glossary.load(fname)
+    gl.journal = True
+    gl.insert(Entry(("kiwi", "n", "a fuzzy fruit", "")))
+    gl.save()
+    with open(gl.journal_fname, 'a') as f:
+        f.write('+ lime | n')
+    reloaded = Glossary.load(fname)
+    assert reloaded.find('l:kiwi') and not reloaded.find('l:lime')
+    # The next save doesn't build on the broken line.
+    reloaded.journal = True
+    reloaded.insert(Entry(("fig", "n", "a soft fruit", "")))
+    reloaded.save()
+    again = Glossary.load(fname)
+    assert again.find('l:kiwi') and again.find('l:fig')
+    with open(gl.journal_fname, 'w') as f:
+        f.write(f"{JOURNAL_MAGIC} {' '.join(map(str, snap.stamp(fname)))}\n+ lime | n\n")
+    try:
+        Glossary.load(fname)
+        assert False
+    except Exception as ex:
+        assert "line 2" in str(ex)
+
+def test_batch(tmp_path):
+    fname = copy_sample(tmp_path)
+    gl = Glossary.load(fname)
+    gl.index
+    generation = gl.generation
+    kiwi = Entry(("kiwi", "n", "a fuzzy fruit", ""))
+    lime = Entry(("lime", "n", "a green fruit", ""))
+    fig = Entry(("fig", "n", "a soft fruit", ""))
+    with gl.batch(save=True):
+        gl.insert(lime)
+        gl.insert(kiwi)
+        gl.insert(fig)
+        gl.delete(gl.find('l:fry')[0])
+        gl.delete(fig)
+        gl.edit(kiwi, defn="a furry fruit")
+        assert not gl.find('l:kiwi')
+    assert gl.generation == generation + 1
+    assert [e.lemma for e in gl.entries] == sorted(e.lemma for e in gl.entries)
+    assert gl.find('d:a furry fruit') == [kiwi]
+    assert not gl.find('l:fry') and not gl.find('l:fig')
+    assert [str(e) for e in Glossary.load(fname).entries] == [str(e) for e in gl.entries]
+
+def test_batch_abandoned_on_error():
+    gl = Glossary.load(SAMPLE_GLOSS_PATH)
+    count = gl.lemma_count
+    try:
+        with gl.batch():
+            gl.insert(Entry(("kiwi", "n", "a fuzzy fruit", "")))
+            raise KeyError()
+    except KeyError:
+        pass
+    assert gl.lemma_count == count and not gl._pending
+
+def test_insert_and_delete_many():
+    gl = Glossary.load(SAMPLE_GLOSS_PATH)
+    new = [Entry((f"zz{i}", "n", f"thing {i}", "")) for i in range(50)]
+    gl.insert_many(reversed(new))
+    assert gl.find('d:thing 7') == [new[7]]
+    gl.delete_many(new[:40])
+    assert gl.lemma_count == 16
+    for expr in INDEXED_QUERIES + ['d:thing*']:
+        assert gl.find(expr) == brute_force_find(gl, expr), expr
+
+def full_stats(glossary):
+    fresh = Glossary()
+    fresh.entries = glossary.entries
+    return fresh.stats
+
+def test_stats_kept_current():
+    gl = Glossary.load(SAMPLE_GLOSS_PATH)
+    assert gl.stats == full_stats(gl)
+    kiwi = Entry(("kiwi", "n fuzzy", "a fuzzy fruit / ~hairy berry", ""))
+    gl.insert(kiwi)
+    assert gl.stats["tags"]["fuzzy"] == 1
+    gl.edit(kiwi, tags="n", defn=":a fruit (fuzzy)")
+    assert "fuzzy" not in gl.stats["tags"]
+    gl.delete(gl.find('l:apple')[0])
+    with gl.batch():
+        gl.insert(Entry(("lime", "n", "a green fruit", "")))
+        gl.delete(gl.find('l:fry')[0])
+    assert gl.stats == full_stats(gl)
+    assert gl.stats["unique entries"] == gl.lemma_count
+
+def test_stats_empty():
+    assert Glossary().stats["unique meanings"] == 0
+
+def test_snapshot_stats(tmp_path):
+    fname = copy_sample(tmp_path)
+    built = Glossary.load(fname, snapshot=True)
+    mapped = Glossary.load(fname, snapshot=True)
+    assert mapped.stats == built.stats
+    assert not any(e.parsed for e in mapped.entries)
+
+def test_trigram_candidates():
+    gl = Glossary.load(SAMPLE_GLOSS_PATH)
+    lemmas = lambda ids: {gl.index.by_id[id].lemma for id in ids}
+    assert lemmas(gl.index.gram_ids('l', MatchExpr('*ick*'))) == {'pickle'}
+    assert lemmas(gl.index.gram_ids('d', MatchExpr('*ugar*'))) == {'sweet'}
+    assert gl.index.gram_ids('d', MatchExpr('*ug*')) is None
+    assert len(gl.index.gram_ids('n', MatchExpr('*serial*'))) == gl.lemma_count
+    kiwi = Entry(("kiwi", "n", "a fuzzy fruit", "sugary"))
+    gl.insert(kiwi)
+    assert gl.find('d:*uzz*') == [kiwi]
+    kiwi = gl.edit(kiwi, lemma="kiwifruit", defn="a hairy fruit")
+    assert not gl.find('d:*uzz*')
+    assert gl.find('l:*ifru*') == [kiwi]
+    gl.delete(kiwi)
+    assert not gl.find('l:*ifru*')
+
+def test_index_copies_share_tables():
+    gl = Glossary.load(SAMPLE_GLOSS_PATH)
+    gl.find('d:*ugar*')
+    before = [(str(e), gl.find(f'l:{e.lemma}')) for e in gl.entries]
+    index = gl.index
+    copy = index.copy()
+    assert copy.by_id.base is index.by_id.base and copy.tokens.base is index.tokens.base
+    # Enough changes to fold them into new tables, which the original keeps out of.
+    for i in range(FOLD_AT // 2):
+        entry = Entry((f"kiwi{i}", "n", f"a fuzzy fruit {i}", "note"))
+        copy.add(entry)
+        if i % 3:
+            copy.remove(entry)
+        copy = copy.copy()
+    assert copy.by_id.base is not index.by_id.base
+    kept = {f"kiwi{i}" for i in range(0, FOLD_AT // 2, 3)}
+    assert len(copy.by_id) == len(index.by_id) + len(kept)
+    assert len(copy.by_id.changes) < FOLD_AT
+    assert {copy.by_id[id].lemma for id in copy.tokens['fuzzy']} == kept
+    assert kept <= {copy.by_id[id].lemma for id in copy.gram_ids('n', MatchExpr('*ote*'))}
+    assert 'fuzzy' not in index.tokens and len(index.by_id) == len(gl.entries)
+    assert [(str(e), gl.find(f'l:{e.lemma}')) for e in gl.entries] == before
+
+def test_find_approx():
+    gl = Glossary.load(SAMPLE_GLOSS_PATH)
+    assert [e.lemma for e in gl.find('~l:fri')] == ['fry']
+    assert [e.lemma for e in gl.find('~d:a yelow fruit')] == ['banana']
+    assert [e.lemma for e in gl.find('~l:swalow')] == ['swallow']
+    assert not gl.find('~l:swalow t:n')
+    assert [e.lemma for e in gl.find('~jonathon')] == ['apple']
+    kiwi = Entry(("kiwi", "n", "recieve", ""))
+    gl.insert(kiwi)
+    assert gl.find('~d:receive') == [kiwi]
+    gl.delete(kiwi)
+    assert not gl.find('~d:receive')
+
+def test_find_approx_ranks_by_distance():
+    gl = Glossary.load(SAMPLE_GLOSS_PATH)
+    gl.insert(Entry(("frya", "v", "to cook", "")))
+    assert [e.lemma for e in gl.find('~l:fryy')] == ['fry', 'frya']
+
+def test_find_ranked():
+    gl = Glossary.load(SAMPLE_GLOSS_PATH)
+    for row in [("bake", "v", "~to cook", ""), ("roast", "v", "to cook slowly", ""),
+                ("boil", "v", "to cook", ""), ("grill", "v", "that is, to cook over a flame", "")]:
+        gl.insert(Entry(row))
+    # Lemma order without ranking; exact, rough, prefix, then infix with it.
+    assert [e.lemma for e in gl.find('d:*to cook*', 10)] == ['bake', 'boil', 'fry', 'grill', 'roast']
+    assert [e.lemma for e in gl.find('d:*to cook*', 10, ranked=True)] == ['boil', 'bake', 'fry', 'roast', 'grill']
+    assert [e.lemma for e in gl.find('d:*to cook*', 2, ranked=True)] == ['boil', 'bake']
+    assert [e.lemma for e in gl.find('d:to cook', 10, ranked=True)] == ['boil', 'bake']
+    assert [e.lemma for e in gl.find('to cook*', ranked=True)] == ['boil', 'bake', 'fry', 'roast']
+    # Same hits as an unranked search, whatever the limit.
+    for n in range(1, 6):
+        assert set(gl.find('d:*to cook*', n, ranked=True)) <= set(gl.find('d:*to cook*', -1))
+    assert gl.find('t:n', 2, ranked=True) == gl.find('t:n', 2)
+
+def test_homonyms_in_list_order():
+    gl = Glossary()
+    gl.insert_many([Entry((f"w{i:02}", "n", f"word {i}", "")) for i in range(20)])
+    gl.index
+    gl.insert(Entry(("bat", "n", "a flying animal of wood", "")))
+    # Goes ahead of the other bat, but gets a later id.
+    gl.insert(Entry(("bat", "v", "to hit with wood", "")))
+    expected = [e for e in gl.entries if e.lemma == 'bat']
+    # The index narrows these down, but ties keep the list's order.
+    assert gl.find('d:*wood*', -1) == expected
+    assert gl.find('d:*wood*', 1) == expected[:1]
+    assert gl.find('t:v', 1) == [e for e in expected if e.tags == ['v']]
+
+def test_readers_see_whole_changes():
+    import threading
+    gl = Glossary.load(SAMPLE_GLOSS_PATH)
+    gl.index
+    errors = []
+    done = threading.Event()
+    def read():
+        try:
+            while not done.is_set():
+                hits = gl.find('d:*fruit*', -1)
+                stats = gl.stats
+                # A kiwi is added with a lime, and both go together.
+                lemmas = {e.lemma for e in hits}
+                assert ('kiwi' in lemmas) == ('lime' in lemmas)
+                assert stats["unique entries"] in (6, 8)
+        except Exception as ex:
+            errors.append(ex)
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for t in readers:
+        t.start()
+    for _ in range(50):
+        kiwi = Entry(("kiwi", "n", "a fuzzy fruit", ""))
+        lime = Entry(("lime", "n", "a green fruit", ""))
+        gl.insert_many([kiwi, lime])
+        gl.delete_many([kiwi, lime])
+    done.set()
+    for t in readers:
+        t.join()
+    assert not errors
+
+def test_find_approx_within_budget():
+    import time
+    g = Glossary()
+    g.insert_many([Entry((f"lemma{i}", "n", f"word{i} gloss{i}", "")) for i in range(20000)])
+    g.insert(Entry(("zo", "v", "to receive", "")))
+    start = time.perf_counter()
+    g.find_approx('~d:to recieve', budget=0.05)
+    # Building the word index counts against the budget...
+    assert time.perf_counter() - start < 1
+    # ...and whatever is left is finished in the background.
+    builder = g.index._near_builder
+    if builder:
+        builder.join()
+    assert [e.lemma for e in g.find('~d:to recieve')] == ['zo']
@@ -32,3 +32,31 @@ def test_advise_func():
 def FIXtest_syllables():
     count = sum(1 for _ in MARTIAN.syllables)
     assert count > 25
+
+def test_layered_glossary(tmp_path):
+    dialect = tmp_path / 'dialect'
+    dialect.mkdir()
+    (dialect / 'cfg.json').write_text(json.dumps({"layers": [MARTIAN.path]}))
+    (dialect / GLOSSARY_NAME).write_text("fry|v|to sizzle\nzap|v|to cook with a ray gun\n")
+    lang = Lang(str(dialect))
+    g = lang.glossary
+    assert [e.lemma for e in g.find('d:to cook*', -1)] == ['zap']
+    assert [e.defn.equivs[0].value for e in g.find('l:fry')] == ['to sizzle']
+    assert [e.lemma for e in g.find('t:v', -1)] == ['fry', 'swallow', 'zap']
+    assert g.lemma_count == MARTIAN.glossary.lemma_count + 1
+    assert g.stats["unique entries"] == g.lemma_count
+
+def test_rewrite_rules():
+    from ..tcoach import rewrite_rules
+    l = Lang('foo')
+    assert l.rewrite_rules == rewrite_rules
+    l.cfg = {"rewrite_rules": [["gonna", "going to"]]}
+    assert l.rewrite_rules[:-1] == rewrite_rules
+    assert l.rewrite_rules[-1].apply("I'm gonna go") == "I'm going to go"
+
+def test_lazy_glossary(tmp_path):
+    (tmp_path / 'cfg.json').write_text(json.dumps({"lazy": True}))
+    (tmp_path / GLOSSARY_NAME).write_text("fry|v|to sizzle\nzap|v|to cook with a ray gun\n")
+    l = Lang(str(tmp_path))
+    assert [e.lemma for e in l.glossary.entries] == ['fry', 'zap']
+    assert not any(e.parsed for e in l.glossary.entries)
@@ -0,0 +1,102 @@
+from ..glossary import Entry, Glossary
+from ..layered import *
+
+import pytest
+
+
+def make_glossary(*rows):
+    g = Glossary()
+    for row in rows:
+        g.insert(Entry(row))
+    return g
+
+
+def make_layers():
+    base = make_glossary(("apple", "n", "a red fruit", ""), ("banana", "n", "a yellow fruit", ""),
+                         ("fry", "v", "to cook in hot oil", ""), ("roast", "v", "to cook slowly", ""))
+    top = make_glossary(("boil", "v", "to cook", ""), ("fry", "v", "~to cook", ""))
+    return base, top, LayeredGlossary([base, top])
+
+
+def test_find_merges_in_order():
+    base, top, g = make_layers()
+    assert [e.lemma for e in g.find('t:v', -1)] == ['boil', 'fry', 'roast']
+    assert [e.lemma for e in g.find('t:v', 2)] == ['boil', 'fry']
+    assert g.find('l:fry') == top.find('l:fry')
+    assert [e.lemma for e in g.find('l:ap', try_fuzzy=True)] == ['apple']
+
+
+def test_find_ranked():
+    base, top, g = make_layers()
+    assert [e.lemma for e in g.find('d:*to cook*', -1, ranked=True)] == ['boil', 'fry', 'roast']
+    assert [e.lemma for e in g.find('d:*to cook*', 1, ranked=True)] == ['boil']
+
+
+def test_entries_and_stats():
+    base, top, g = make_layers()
+    assert [e.lemma for e in g.entries] == ['apple', 'banana', 'boil', 'fry', 'roast']
+    assert g.lemma_count == 5
+    assert g.stats["tags"] == {"n": 2, "v": 3}
+
+
+def test_changes_go_to_top():
+    base, top, g = make_layers()
+    apple = base.find('l:apple')[0]
+    with pytest.raises(ValueError):
+        g.delete(apple)
+    edited = g.edit(apple, notes="a pome")
+    assert apple.notes == ""
+    assert top.find('l:apple') == [edited]
+    assert g.find('l:apple') == [edited]
+    g.delete(edited)
+    assert g.find('l:apple') == [apple]
+    g.insert(Entry(("cherry", "n", "a small red fruit", "")))
+    assert top.lemma_count == 3 and base.lemma_count == 4
+
+
+def test_edit_cant_rename_lower_entry():
+    base, top, g = make_layers()
+    apple = base.find('l:apple')[0]
+    with pytest.raises(ValueError):
+        g.edit(apple, lemma="pome")
+    assert [e.lemma for e in g.entries] == ['apple', 'banana', 'boil', 'fry', 'roast']
+    assert g.edit(apple, lemma="apple", notes="x").notes == "x"
+
+
+def test_find_approx_ranks_across_layers():
+    base = make_glossary(("fry", "v", "to cook in hot oil", ""), ("roast", "v", "to cook slowly", ""))
+    top = make_glossary(("frya", "n", "a fried cake", ""))
+    g = LayeredGlossary([base, top])
+    assert [e.lemma for e in g.find('~l:fry')] == ['fry', 'frya']
+    assert [e.lemma for e in g.find('~l:fry', 1)] == ['fry']
+    # Hidden entries don't count.
+    top.insert(Entry(("fry", "v", "~to cook", "")))
+    assert g.find('~l:fry') == [top.find('l:fry')[0], top.find('l:frya')[0]]
+
+
+def test_repl_delete_lower_entry(capsys):
+    from types import SimpleNamespace
+    from ..commands import repl
+    base, top, g = make_layers()
+    ctx = SimpleNamespace(lang=SimpleNamespace(glossary=g))
+    repl.delete(ctx, base.find('l:apple')[0])
+    assert "lower layer" in capsys.readouterr().out
+    assert [e.lemma for e in g.find('l:apple')] == ['apple']
+
+
+def test_counts_are_cached():
+    base, top, g = make_layers()
+    stats = g.stats
+    assert g.stats is stats and g.lemma_count == 5
+    g.insert(Entry(("cherry", "n", "a small red fruit", "")))
+    assert g.lemma_count == 6
+    assert g.stats is not stats and g.stats["tags"] == {"n": 3, "v": 3}
+
+
+def test_edit_lower_entry_publishes_once():
+    base, top, g = make_layers()
+    generation = top.generation
+    apple = base.find('l:apple')[0]
+    edited = g.edit(apple, notes="a pome")
+    assert top.generation == generation + 1
+    assert top.find('l:apple') == [edited] and edited.notes == "a pome"
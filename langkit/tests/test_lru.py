@@ -0,0 +1,19 @@
+from ..lru import *
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert len(cache) == 2
+
+def test_lru_counts():
+    cache = LRUCache(2)
+    assert cache.get('x') is None
+    cache.put('x', 0)
+    assert cache.get('x') == 0
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,42 @@
+import random
+
+from ..symdel import *
+
+def test_edit_distance():
+    assert edit_distance('', 'abc') == 3
+    assert edit_distance('kitten', 'sitting') == 3
+    assert edit_distance('recieve', 'receive') == 2
+    assert edit_distance('same', 'same') == 0
+    assert bounded_distance('kitten', 'sitting', 2) == 3
+    assert bounded_distance('recieve', 'receive', 2) == 2
+
+def test_deletes():
+    assert deletes('abc', 1) == {'abc', 'bc', 'ac', 'ab'}
+    assert deletes('abc', 2) == deletes('abc', 1) | {'a', 'b', 'c'}
+    assert deletes('aab', 3) == {'aab', 'ab', 'aa', 'a', 'b', ''}
+
+def test_search():
+    index = DeleteIndex()
+    for i, word in enumerate(['book', 'books', 'cake', 'boo', 'cape', 'cart']):
+        index.add(word, i)
+    assert [w for _, w, _ in index.search('bok', 1)] == ['boo', 'book']
+    index.discard('boo', 3)
+    assert [w for _, w, _ in index.search('bok', 1)] == ['book']
+    assert [w for _, w, _ in index.search('cake', 1)] == ['cake', 'cape']
+
+def test_search_finds_everything_in_range():
+    # Keys only cover the start of each word; make sure that loses nothing.
+    rnd = random.Random(5)
+    words = sorted({''.join(rnd.choice('abc ') for _ in range(rnd.randint(0, 12))) for _ in range(100)})
+    index = DeleteIndex()
+    for i, word in enumerate(words):
+        index.add(word, i)
+    for _ in range(20):
+        # Near misses of known words, so that long words turn up too.
+        query = rnd.choice(words)
+        for _ in range(rnd.randint(1, 3)):
+            i = rnd.randint(0, len(query))
+            query = query[:i] + rnd.choice(['', 'a', 'c']) + query[i + rnd.randint(0, 1):]
+        for max_distance in (1, 2):
+            expected = sorted((edit_distance(query, w), w) for w in words if edit_distance(query, w) <= max_distance)
+            assert [(d, w) for d, w, _ in index.search(query, max_distance)] == expected
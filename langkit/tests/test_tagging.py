@@ -0,0 +1,41 @@
+import pickle
+
+import pytest
+
+from ..tagging import *
+
+builtin = LexiconBackend()
+
+def tags(text):
+    return [tag for words in builtin.tag_sents([builtin.word_tokenize(s) for s in builtin.sent_tokenize(text)])
+            for _, tag in words]
+
+def test_sent_tokenize():
+    text = 'Mr. Smith said "I know." Then he left! Did he? yes.'
+    assert builtin.sent_tokenize(text) == ['Mr. Smith said "I know."', 'Then he left!', 'Did he? yes.']
+
+def test_word_tokenize():
+    assert builtin.word_tokenize("I don't know, it's 5.30 in the U.S.") == \
+        ['I', 'do', "n't", 'know', ',', 'it', "'s", '5.30', 'in', 'the', 'U.S.']
+    assert builtin.word_tokenize("She cannot eat well-made bread...") == \
+        ['She', 'can', 'not', 'eat', 'well-made', 'bread', '...']
+
+def test_tags():
+    assert tags("this is a test") == ['DT', 'VBZ', 'DT', 'NN']
+    assert tags("I eat a banana.") == ['PRP', 'VBP', 'DT', 'NN', '.']
+    assert tags("Fry the apple.") == ['VB', 'DT', 'NN', '.']
+    assert tags("The people were working on the new system.") == \
+        ['DT', 'NN', 'VBD', 'VBG', 'IN', 'DT', 'JJ', 'NN', '.']
+    assert tags("They have finished it quickly.") == ['PRP', 'VBP', 'VBN', 'PRP', 'RB', '.']
+    assert tags("She will eat her apples with Bob.") == ['PRP', 'MD', 'VB', 'PRP$', 'NNS', 'IN', 'NNP', '.']
+
+def test_backends():
+    assert isinstance(get_backend(), NltkBackend)
+    assert isinstance(get_backend('builtin'), LexiconBackend)
+    with pytest.raises(ValueError):
+        get_backend('nope')
+
+def test_pickle():
+    builtin.tag(['zorbing'])
+    copy = pickle.loads(pickle.dumps(builtin))
+    assert copy.tag(['zorbing']) == builtin.tag(['zorbing'])
@@ -3,7 +3,7 @@ from ..tcoach import *
 class FakeGlossary:
     def __init__(self, items):
         self.items = items
-    def find(self, expr):
+    def find(self, expr, **kwargs):
         for item in self.items:
             if item == expr:
                 return [item]
@@ -38,3 +38,100 @@ def test_hints():
                     break
             assert ex in found
     assert_hints("this is a test", 'p:det d:this', 'INSERTED', 'd:be', 'p:quant d:a', 'p:n d:test')
+
+def test_hints_builtin_backend():
+    tc = TranslationCoach(glossary, mock_advise, backend='builtin')
+    results = [str(h) for h in tc.hints("this is a test")]
+    assert results == ['p:det d:this', 'INSERTED', 'p:v d:be', 'p:quant d:a', 'p:n d:test']
+
+def test_hints_many():
+    tc = TranslationCoach(glossary, mock_advise)
+    docs = ["this is a test", "a test", "this is"]
+    expected = [[str(h) for h in tc.hints(doc)] for doc in docs]
+    for processes in (1, None):
+        got = [[str(h) for h in hints] for hints in tc.hints_many(docs, processes)]
+        assert got == expected
+
+def test_hints_many_in_workers():
+    from ..lang import Lang
+    import os
+    martian = Lang(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'martian'))
+    tc = TranslationCoach(martian.glossary, martian.advise_func)
+    docs = ["I eat a banana.", "Fry the apple. Then swallow it."] * 3
+    expected = [[repr(h) for h in tc.hints(doc)] for doc in docs]
+    got = [[repr(h) for h in hints] for hints in tc.hints_many(docs, processes=2)]
+    assert got == expected
+
+def test_memo(tmp_path):
+    from ..glossary import Glossary, Entry
+    import os
+    fname = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'martian', 'glossary.txt')
+    memo_fname = str(tmp_path / 'memo.json')
+    tc = TranslationCoach(Glossary.load(fname), memo_fname=memo_fname)
+    first = [repr(h) for h in tc.hints("I eat a banana.")]
+    assert any(word == 'banana' for word, tag in tc._memo)
+    assert [repr(h) for h in tc.hints("I eat a banana.")] == first
+    assert tc.save_memo()
+    again = TranslationCoach(Glossary.load(fname), memo_fname=memo_fname)
+    assert again._memo == tc._memo
+    # Changing the glossary forgets what was remembered.
+    tc.glossary.insert(Entry(("xo", "v", "to eat", "")))
+    assert not tc._memo
+    assert 'xo' in [h.lemma for h in tc.hints("I eat a banana.")]
+
+def test_memo_after_journaled_save(tmp_path):
+    from ..glossary import Glossary, Entry
+    import os, shutil
+    fname = str(tmp_path / 'glossary.txt')
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'martian', 'glossary.txt'), fname)
+    memo_fname = str(tmp_path / 'memo.json')
+    tc = TranslationCoach(Glossary.load(fname), memo_fname=memo_fname, backend='builtin')
+    assert 'xo' not in [h.lemma for h in tc.hints("I eat a banana.")]
+    assert tc.save_memo()
+    g = Glossary.load(fname)
+    g.journal = True
+    g.insert(Entry(("xo", "v", "to eat", "")))
+    g.save()
+    assert os.path.exists(g.journal_fname)
+    # The glossary file itself didn't change, but the memo is still stale.
+    again = TranslationCoach(Glossary.load(fname), memo_fname=memo_fname, backend='builtin')
+    assert not again._memo
+    assert 'xo' in [h.lemma for h in again.hints("I eat a banana.")]
+
+def test_hints_many_builtin_backend():
+    from ..lang import Lang
+    import os
+    martian = Lang(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'martian'))
+    tc = TranslationCoach(martian.glossary, martian.advise_func, backend='builtin')
+    docs = ["I eat a banana.", "Fry the apple. Then swallow it."] * 3
+    expected = [[repr(h) for h in tc.hints(doc)] for doc in docs]
+    got = [[repr(h) for h in hints] for hints in tc.hints_many(docs, processes=2)]
+    assert got == expected
+
+def test_hints_stream():
+    import io
+    tc = TranslationCoach(glossary, backend='builtin')
+    text = "this is a test. It isn't\na test, and this\nis a test.\n\nA test\n"
+    expected = [repr(h) for h in tc.hints("this is a test. It isn't a test, and this is a test.")]
+    expected += [repr(h) for h in tc.hints("A test")]
+    assert [repr(h) for h in tc.hints_stream(io.StringIO(text))] == expected
+    # A sentence that doesn't end soon enough is cut at a space.
+    got = [h.word for h in tc.hints_stream(io.StringIO("a test " * 10), max_lookahead=20)]
+    assert got == ['a', 'test'] * 10
+    # However long the line.
+    sizes = []
+    tc._hints = lambda sentences: sizes.extend(len(s) for s in sentences) or []
+    list(tc.hints_stream(io.StringIO("a test " * 30 + "\n" + "a test " * 30), max_lookahead=20))
+    assert sizes and max(sizes) <= 20
+
+def test_rewrite_rules():
+    text = "It’s “fine”; we won't, can't and don't. Y'all're here."
+    expected = text
+    for rule in rewrite_rules:
+        expected = rule.apply(expected)
+    assert rewrite(text) == expected
+    # Later rules see what earlier ones put in.
+    custom = Rewriter(rewrite_rules + [("will not", "shan't"), ("n't", "NOT")])
+    assert custom("I won't") == "I shaNOT"
+    tc = TranslationCoach(glossary, backend='builtin', rewrite_rules=[('these', 'this'), ('am', 'is')])
+    assert [str(h) for h in tc.hints("these am a test")][:2] == ['p:det d:this', 'p:v d:be']
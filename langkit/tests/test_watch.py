@@ -0,0 +1,140 @@
+from ..glossary import Glossary, Entry
+from ..watch import *
+
+import os
+import shutil
+
+SAMPLE_MD_GLOSS_PATH = os.path.join(os.path.dirname(__file__), 'martian', 'glossary.md')
+
+
+def load_copy(tmp_path):
+    fname = str(tmp_path / 'glossary.md')
+    shutil.copy(SAMPLE_MD_GLOSS_PATH, fname)
+    return Glossary.load(fname)
+
+
+def rewrite(fname, old, new):
+    with open(fname) as f:
+        text = f.read()
+    assert old in text
+    with open(fname, 'w') as f:
+        f.write(text.replace(old, new))
+    # Don't depend on the clock ticking between writes.
+    st = os.stat(fname)
+    os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000))
+
+
+def test_changed_range():
+    assert changed_range(list('abcd'), list('abcd')) == (4, 4, 4)
+    assert changed_range(list('abcd'), list('abxyd')) == (2, 3, 4)
+    assert changed_range(list('abcd'), list('ad')) == (1, 3, 1)
+    assert changed_range(list('aa'), list('aaa')) == (2, 2, 3)
+
+
+def test_poll_patches_changed_rows(tmp_path):
+    g = load_copy(tmp_path)
+    w = Watcher(g)
+    assert not w.poll()
+    apple = g.find('l:apple')[0]
+    generation = g.generation
+    rewrite(g.fname, "banana|n|a yellow fruit\n", "banana|n|a long yellow fruit\ncherry|n|a small red fruit\n")
+    assert w.poll()
+    # Untouched entries weren't reparsed.
+    assert g.find('l:apple')[0] is apple
+    assert g.generation > generation
+    assert [e.lemma for e in g.find('d:*fruit', -1)] == ['apple', 'banana', 'cherry']
+    assert g.find('d:a long*')[0].lemma == 'banana'
+    assert not g._unsaved
+    assert g.stats == Glossary.load(g.fname).stats
+
+
+def test_poll_reloads_for_text_outside_table(tmp_path):
+    g = load_copy(tmp_path)
+    w = Watcher(g)
+    rewrite(g.fname, "a paragraph of text", "a different paragraph")
+    assert w.poll()
+    assert "a different paragraph" in g.pre
+    assert g.lemma_count == Glossary.load(g.fname).lemma_count
+
+
+def test_poll_ignores_own_saves(tmp_path):
+    g = load_copy(tmp_path)
+    w = Watcher(g)
+    g.insert(Entry(("cherry", "n", "a small red fruit", "")))
+    g.save()
+    assert not w.poll()
+    rewrite(g.fname, "cherry | n | a small red fruit", "cherry | n | a sour red fruit")
+    assert w.poll()
+    assert [str(e.defn) for e in g.find('l:cherry')] == ['a sour red fruit']
+    assert g.lemma_count == Glossary.load(g.fname).lemma_count
+
+
+def test_outside_edit_after_own_save_without_poll(tmp_path):
+    g = load_copy(tmp_path)
+    # Rows the way the glossary writes them, so its save only adds cherry.
+    g.save(force=True)
+    g = Glossary.load(g.fname)
+    w = Watcher(g)
+    g.insert(Entry(("cherry", "n", "a small red fruit", "")))
+    g.save()
+    # No poll between the save and the outside edit.
+    rewrite(g.fname, "banana | n | a yellow fruit", "banana | n | a long yellow fruit")
+    assert w.poll()
+    lemmas = [e.lemma for e in g.entries]
+    assert lemmas.count('cherry') == 1
+    assert [e.lemma for e in g.find('d:*fruit', -1)] == ['apple', 'banana', 'cherry']
+    g.insert(Entry(("date", "n", "a sweet brown fruit", "")))
+    g.save()
+    assert [e.lemma for e in Glossary.load(g.fname).find('d:*fruit', -1)] == ['apple', 'banana', 'cherry', 'date']
+
+
+def test_outside_edit_after_own_save_missed_by_watcher(tmp_path):
+    g = load_copy(tmp_path)
+    g.save(force=True)
+    g = Glossary.load(g.fname)
+    w = Watcher(g)
+    g._on_write.remove(w._saved)
+    g.insert(Entry(("cherry", "n", "a small red fruit", "")))
+    g.save()
+    rewrite(g.fname, "banana | n | a yellow fruit", "banana | n | a long yellow fruit")
+    # Without word of the save, the watcher reloads rather than patching.
+    assert w.poll()
+    assert [e.lemma for e in g.entries].count('cherry') == 1
+    assert [e.lemma for e in g.find('d:*fruit', -1)] == ['apple', 'banana', 'cherry']
+
+
+def test_reload_keeps_journaled_changes(tmp_path):
+    g = load_copy(tmp_path)
+    g.journal = True
+    w = Watcher(g)
+    g.insert(Entry(("kiwi", "n", "a fuzzy fruit", "")))
+    g.save()
+    assert os.path.exists(g.journal_fname)
+    # Can't be patched in, so the glossary reloads.
+    rewrite(g.fname, "a paragraph of text", "a different paragraph")
+    assert w.poll()
+    assert g.find('l:kiwi') and "a different paragraph" in g.pre
+    assert not os.path.exists(g.journal_fname)
+    assert Glossary.load(g.fname).find('l:kiwi')
+
+
+def test_poll_waits_for_own_save(tmp_path):
+    import threading
+    g = load_copy(tmp_path)
+    g.save(force=True)
+    g = Glossary.load(g.fname)
+    w = Watcher(g)
+    write = g._write_atomically
+    pollers = []
+    def write_then_poll(fname):
+        # Poll after the file is replaced but before the save has
+        # recorded its stamp.
+        write(fname)
+        pollers.append(threading.Thread(target=w.poll))
+        pollers[0].start()
+        pollers[0].join(0.2)
+    g._write_atomically = write_then_poll
+    g.insert(Entry(("kiwi", "n", "a fuzzy fruit", "")))
+    g.save()
+    pollers[0].join()
+    assert [e.lemma for e in g.entries].count('kiwi') == 1
@@ -43,7 +43,10 @@ def _calc_terminal_size():
 
         return sizex, sizey
     else:
-        rows, columns = os.popen('stty size', 'r').read().split()
+        size = os.popen('stty size 2>/dev/null', 'r').read().split()
+        if len(size) != 2:
+            return 80, 25  # not a terminal, e.g. when reading from a pipe
+        rows, columns = size
         return int(columns), int(rows)
 
 _last_termsize_check = 0
@@ -0,0 +1,157 @@
+"""
+Keeps a loaded glossary in step with edits that other programs make to
+its file.
+
+The standard library has no portable way to be told about file changes,
+so we poll the file's mtime and size, which costs one stat() per poll.
+When the file changes, only the lines between the unchanged head and
+tail of the file are parsed, and the glossary is patched with the rows
+that went away and the ones that showed up.
+"""
+import threading
+
+from .glossary import Entry, _is_divider, _is_header
+from . import snapshot as snap
+
+POLL_INTERVAL = 1.0
+
+
+def changed_range(old, new):
+    """
+    Compare two lists of lines. Returns (start, old_end, new_end) such
+    that old[start:old_end] was replaced by new[start:new_end].
+    """
+    n = min(len(old), len(new))
+    start = 0
+    while start < n and old[start] == new[start]:
+        start += 1
+    tail = 0
+    while tail < n - start and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+    return start, len(old) - tail, len(new) - tail
+
+
+def _rows(lines):
+    """
+    The glossary rows in some lines from the middle of a table, or None
+    if there's anything else besides blank lines.
+    """
+    rows = []
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if '|' not in stripped:
+            return None
+        try:
+            entry = Entry(stripped)
+        except Exception:
+            return None
+        if _is_header(entry) or _is_divider(entry):
+            return None
+        rows.append(stripped)
+    return rows
+
+
+class Watcher:
+    """
+    Call poll() whenever it's convenient, or start() a thread that does
+    so every interval seconds. The watcher keeps its own copy of the
+    file's lines to compare new versions with. A change that can't be
+    patched in makes the glossary reload, which drops unsaved changes.
+    """
+    def __init__(self, glossary, interval=POLL_INTERVAL):
+        self.glossary = glossary
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._sync()
+        # Keep our copy in step with the glossary's own saves, so that an
+        # outside edit is compared with what the glossary wrote.
+        glossary._on_write.append(self._saved)
+
+    def _read(self):
+        # Stat first: if the file changes while we read, the next poll
+        # sees a new stamp and finds whatever we missed.
+        stamp = snap.stamp(self.glossary.fname)
+        with open(self.glossary.fname, 'rt') as f:
+            return stamp, f.readlines()
+
+    def _sync(self):
+        self._stamp, self._lines = self._read()
+
+    def _saved(self):
+        stamp, lines = self._read()
+        if stamp != self.glossary._stamp:
+            # Someone else wrote the file right after the glossary did, so
+            # we don't have a copy to compare their version with.
+            stamp, lines = self.glossary._stamp, None
+        self._stamp, self._lines = stamp, lines
+
+    def poll(self):
+        """
+        Bring the glossary up to date with its file. Returns True if the
+        file had been changed by someone else.
+        """
+        g = self.glossary
+        # Hold off the glossary's own saves, so that one isn't taken for
+        # an outside edit between its write and its new stamp.
+        with g._lock:
+            try:
+                stamp = snap.stamp(g.fname)
+            except FileNotFoundError:
+                # Probably caught in the middle of a replace; try next time.
+                return False
+            if stamp == self._stamp:
+                return False
+            if stamp == g._stamp:
+                # The glossary saved itself; there's nothing to catch up on.
+                self._sync()
+                return False
+            stale = g._stamp != self._stamp
+            stamp, lines = self._read()
+            # If the glossary wrote the file since we last read it, our copy
+            # isn't what the outside edit was made to, so it can't be diffed.
+            if stale or self._lines is None or not self._patch(self._lines, lines):
+                # The journal won't match the new file, so reloading would
+                # drop its changes; keep them to apply on top.
+                journaled = g._journal_changes(any_version=True) if g._journal_len else None
+                g.reload()
+                g._replay_journal(journaled)
+            self._stamp, self._lines = stamp, lines
+            g._stamp = stamp
+            if g._journal_len:
+                # The journal was written against the old file, so it can't
+                # be replayed onto the new one. Fold it in now.
+                g.compact()
+            return True
+
+    def _patch(self, old, new):
+        start, old_end, new_end = changed_range(old, new)
+        table = [i for i, line in enumerate(old) if '|' in line]
+        # Changes to the text around the table, or to its header and
+        # divider, are rare enough that a full reload is fine for them.
+        if not table or start <= table[0] + 1 or old_end > table[-1] + 1:
+            return False
+        removed = _rows(old[start:old_end])
+        added = _rows(new[start:new_end])
+        if removed is None or added is None:
+            return False
+        return self.glossary.patch(removed, added)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='glossary-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
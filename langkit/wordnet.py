@@ -1,26 +1,29 @@
-import nltk
-try:
-    from nltk.corpus import wordnet
-except LookupError:
-    print("Downloading NLTK resources...")
-    nltk.download('wordnet', quiet=True)
-    from nltk.corpus import wordnet
+# nltk and the wordnet corpus are slow to load, so wait until they're used.
+_wordnet = None
 
-
-# Download NLTK resources if needed.
-#if not nltk.data.find('corpora/wordnet'):
-#    nltk.download('wordnet')
+def load_wordnet():
+    global _wordnet
+    if _wordnet is None:
+        import nltk
+        try:
+            nltk.data.find('corpora/wordnet')
+        except LookupError:
+            print("Downloading NLTK resources...")
+            nltk.download('wordnet', quiet=True)
+        from nltk.corpus import wordnet
+        _wordnet = wordnet
+    return _wordnet
 
 def get_synonyms(word):
     synonyms = []
-    for syn in wordnet.synsets(word):
+    for syn in load_wordnet().synsets(word):
         for lemma in syn.lemmas():
             synonyms.append(lemma.name())
     return set(synonyms)
 
 def get_related_words(word):
     related_words = []
-    for synset in wordnet.synsets(word):
+    for synset in load_wordnet().synsets(word):
         related_words.extend([word for word in synset.hyponyms()])
         related_words.extend([word for word in synset.hypernyms()])
     return set(related_words)